@@ -1,6 +1,9 @@
+import os
 import gradio as gr
-from webui.module import create_project_directory, get_project_names, update_fields, save_project_settings, get_models, download_model, models
-from webui.od import train, getTFRecord, export
+from webui.module import create_project_directory, get_project_names, update_fields, save_project_settings, get_models, download_model, models, get_dataset_statistics, get_training_metrics, get_job_choices, control_job
+from webui.od import train, getTFRecord, export, attach_job, preview_config, autotune, TUNE_BURST_STEPS
+from modules.jobScheduler import scheduler
+from modules.tfWorker import ensure_worker, enabled as warm_worker_enabled
 
 def update_ui(project_name):
     if project_name:
@@ -38,7 +41,7 @@ with gr.Blocks() as demo:
             create_button = gr.Button("新增")
 
         with gr.Row():
-            dataset_format = gr.Dropdown(["xml", "json"], label="資料集格式")
+            dataset_format = gr.Dropdown(["xml", "json", "coco"], label="資料集格式")
             training_classes = gr.Textbox(label="訓練類別", lines=1, placeholder="Enter comma-separated strings...")
         
         with gr.Row():
@@ -56,6 +59,49 @@ with gr.Blocks() as demo:
         save_button = gr.Button("存取以上資訊")
 
 
+    with gr.Accordion("轉換設定", open=False):
+        with gr.Row():
+            num_workers = gr.Number(value=os.cpu_count() or 1, minimum=1, step=1, label="轉換進程數")
+            num_shards = gr.Number(value=0, minimum=0, step=1, label="分片數量 (0 為依大小自動計算)")
+            shard_size_mb = gr.Number(value=200, minimum=1, step=1, label="分片目標大小 (MB)")
+            memory_budget_mb = gr.Number(value=1024, minimum=64, step=64, label="轉換記憶體預算 (MB)")
+            compression = gr.Dropdown(["NONE", "GZIP", "ZLIB"], value="NONE", label="TFRecord 壓縮")
+        drop_invalid_boxes = gr.Checkbox(value=False, label="略過無效標註框 (反向或面積為零)")
+        aspect_buckets = gr.Checkbox(value=False, label="依寬高比分組寫入分片 (減少批次補邊)")
+        with gr.Row():
+            resize_images = gr.Checkbox(value=False, label="依參考模型輸入尺寸縮小影像")
+            jpeg_quality = gr.Slider(minimum=50, maximum=100, value=90, step=1, label="JPEG 品質")
+
+    with gr.Accordion("資料集統計", open=False):
+        dataset_stats = gr.Markdown()
+
+    with gr.Accordion("訓練數據", open=False):
+        with gr.Row():
+            loss_plot = gr.LinePlot(x="step", y="value", color="metric", title="Loss", width=500)
+            speed_plot = gr.LinePlot(x="step", y="steps_per_sec", color="run", title="Steps/sec", width=500)
+            map_plot = gr.LinePlot(x="step", y="value", color="metric", title="mAP", width=500)
+
+    with gr.Accordion("模型設定預覽", open=False):
+        preview_button = gr.Button("預覽合併設定")
+        merged_config = gr.Code(label="pipeline.config", interactive=False)
+
+    with gr.Accordion("效能調校", open=False):
+        with gr.Row():
+            burst_steps = gr.Number(value=TUNE_BURST_STEPS, minimum=200, step=100, label="每組設定的訓練步數")
+            autotune_button = gr.Button("自動調校執行緒與輸入管線")
+
+    with gr.Accordion("背景工作", open=False):
+        with gr.Row():
+            job_id = gr.Dropdown([], label="工作")
+            num_cores = gr.Number(value=0, minimum=0, step=1, label="訓練核心數 (0 為整台機器)")
+            eval_sample_n = gr.Number(value=0, minimum=0, step=1, label="同時評估，取樣 1/N 測試資料 (0 為不評估)")
+        with gr.Row():
+            refresh_jobs_button = gr.Button("重新整理")
+            attach_button = gr.Button("重新連線")
+            pause_button = gr.Button("暫停")
+            resume_button = gr.Button("繼續")
+            cancel_button = gr.Button("取消")
+
     output_text = gr.Textbox(label="輸出結果", interactive=False)
     with gr.Row():
         get_tfrecord_button = gr.Button("轉換資料")
@@ -81,17 +127,84 @@ with gr.Blocks() as demo:
             batch_size, 
             num_steps, 
             checkpoint_every_n, 
-            reference_model
+            reference_model,
+            num_cores,
+            eval_sample_n
         ],
-        outputs=output_text
+        outputs=[output_text, loss_plot, speed_plot, map_plot]
     )
 
     get_tfrecord_button.click(
         fn=getTFRecord, 
-        inputs=[project_name, dataset_format, task_name],
+        inputs=[project_name, dataset_format, task_name, num_workers, num_shards, shard_size_mb, training_classes, drop_invalid_boxes,
+                reference_model, resize_images, jpeg_quality, memory_budget_mb, compression, aspect_buckets],
+        outputs=output_text
+    ).then(
+        fn=get_dataset_statistics,
+        inputs=[project_name, task_name],
+        outputs=dataset_stats
+    )
+
+    task_name.change(
+        fn=get_dataset_statistics,
+        inputs=[project_name, task_name],
+        outputs=dataset_stats
+    )
+
+    task_name.change(
+        fn=get_training_metrics,
+        inputs=[project_name, task_name],
+        outputs=[loss_plot, speed_plot, map_plot]
+    )
+
+    autotune_button.click(
+        fn=autotune,
+        inputs=[project_name, task_name, batch_size, reference_model, burst_steps],
         outputs=output_text
     )
 
+    preview_button.click(
+        fn=preview_config,
+        inputs=[project_name, task_name, batch_size, num_steps, reference_model],
+        outputs=merged_config
+    )
+
+    refresh_jobs_button.click(
+        fn=get_job_choices,
+        inputs=project_name,
+        outputs=job_id
+    )
+
+    attach_button.click(
+        fn=attach_job,
+        inputs=[project_name, job_id],
+        outputs=output_text
+    )
+
+    pause_button.click(
+        fn=lambda pn, job: control_job(pn, job, "pause"),
+        inputs=[project_name, job_id],
+        outputs=output_text
+    )
+
+    resume_button.click(
+        fn=lambda pn, job: control_job(pn, job, "resume"),
+        inputs=[project_name, job_id],
+        outputs=output_text
+    )
+
+    cancel_button.click(
+        fn=lambda pn, job: control_job(pn, job, "cancel"),
+        inputs=[project_name, job_id],
+        outputs=output_text
+    )
+
+    project_name.change(
+        fn=get_job_choices,
+        inputs=project_name,
+        outputs=job_id
+    )
+
     create_button.click(
         fn=create_project_directory,
         inputs=new_project_name,
@@ -142,4 +255,9 @@ with gr.Blocks() as demo:
     )
 
 if __name__ == "__main__":
+    # 伺服器重啟後繼續執行佇列中的工作
+    scheduler.start()
+    # OD_WARM_WORKER=1 時預先啟動已匯入 TensorFlow 的 fork server，訓練與輸出模型不必每次重新匯入
+    if warm_worker_enabled():
+        ensure_worker()
     demo.launch()
\ No newline at end of file
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import PIL.Image
+
+
+# (名稱, 寬高比下限, 寬高比上限)，寬高比為 width / height
+ASPECT_BUCKETS = (
+  ('portrait', 0.0, 0.8),
+  ('square', 0.8, 1.25),
+  ('landscape', 1.25, 2.0),
+  ('panorama', 2.0, np.inf),
+)
+
+def image_size(image_path: str) -> tuple:
+  # 只讀取影像檔頭取得尺寸，不解碼
+  try:
+    with PIL.Image.open(image_path) as image:
+      return image.size
+  except Exception:
+    return 0, 0
+
+def image_sizes(image_paths: list, num_threads: int = 16) -> np.ndarray:
+  with ThreadPoolExecutor(max_workers=num_threads) as executor:
+    return np.array(list(executor.map(image_size, image_paths)), dtype=np.float64).reshape(-1, 2)
+
+def bucket_names(sizes: np.ndarray) -> list:
+  # 無法取得尺寸的影像歸入 square
+  ratios = np.where(sizes[:, 1] > 0, sizes[:, 0] / np.maximum(sizes[:, 1], 1), 1.0)
+  bounds = [upper for _, _, upper in ASPECT_BUCKETS[:-1]]
+  return [ASPECT_BUCKETS[index][0] for index in np.searchsorted(bounds, ratios, side='right')]
+
+def padding_fraction(sizes: np.ndarray, buckets: list = None) -> float:
+  # keep_aspect_ratio_resizer 將長邊縮至相同長度，影像所佔的比例為 (w', h')，長邊為 1
+  # 不分組時所有影像補到 1 x 1；分組後同一批次只補到組內最大的 w' 與 h'（以整組估計最差情況）
+  valid = (sizes[:, 0] > 0) & (sizes[:, 1] > 0)
+  if not valid.any():
+    return 0.0
+  shapes = sizes[valid] / sizes[valid].max(axis=1, keepdims=True)
+  if buckets is None:
+    return 1.0 - float(np.mean(shapes[:, 0] * shapes[:, 1]))
+
+  buckets = np.asarray(buckets)[valid]
+  canvas = 0.0
+  for name in np.unique(buckets):
+    bucket_shapes = shapes[buckets == name]
+    canvas += len(bucket_shapes) * float(np.prod(bucket_shapes.max(axis=0)))
+  return 1.0 - float(np.sum(shapes[:, 0] * shapes[:, 1])) / canvas if canvas else 0.0
+
+def format_padding(sizes: np.ndarray, buckets: list) -> str:
+  counts = {name: buckets.count(name) for name, _, _ in ASPECT_BUCKETS if name in buckets}
+  before = padding_fraction(sizes)
+  after = padding_fraction(sizes, buckets)
+  return (f"aspect buckets {', '.join(f'{name}={count}' for name, count in counts.items())}; "
+          f'estimated padding {100 * before:.0f}% -> {100 * after:.0f}%')
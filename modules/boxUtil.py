@@ -0,0 +1,95 @@
+import numpy as np
+
+
+BOX_ERRORS = ('inverted', 'zero_area')
+BOX_WARNINGS = ('out_of_bounds',)
+# 無法讀取或格式錯誤的標註檔，不列入類別與分片，轉換照常進行
+FILE_ERRORS = ('unreadable',)
+
+def json_boxes(data: dict) -> tuple:
+  # labelme 矩形的兩個角點依序視為左上與右下，不排序，角點反向時由 check_boxes 回報為 inverted
+  shapes = data.get('shapes', [])
+  labels = [shape['label'] for shape in shapes]
+  points = np.array([shape['points'][:2] for shape in shapes], dtype=np.float32).reshape(-1, 4)
+  return points, labels
+
+def voc_boxes(data: dict) -> tuple:
+  # read_voc 與 read_coco 已直接產生座標陣列
+  return data['boxes'], data['labels']
+
+def annotation_boxes(data: dict, file_format: str) -> tuple:
+  try:
+    if file_format in ('xml', 'coco'):
+      return voc_boxes(data)
+    return json_boxes(data)
+  except KeyError as e:
+    raise ValueError(f'Missing key {e} in object data')
+  except (TypeError, ValueError) as e:
+    raise ValueError(f'Invalid box coordinates: {e}')
+
+def annotation_size(data: dict, file_format: str) -> tuple:
+  # 標註檔記錄的影像尺寸，缺少時回傳 (0, 0) 並略過邊界檢查
+  try:
+    if file_format in ('xml', 'coco'):
+      return int(data['width']), int(data['height'])
+    return int(data['imageWidth']), int(data['imageHeight'])
+  except (KeyError, TypeError, ValueError):
+    return 0, 0
+
+def check_boxes(boxes: np.ndarray, width, height) -> dict:
+  # width, height 可為純量或與 boxes 等長的陣列，一次檢查整批標註框
+  width = np.asarray(width, dtype=np.float32)
+  height = np.asarray(height, dtype=np.float32)
+  xmin, ymin, xmax, ymax = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+  inverted = (xmax < xmin) | (ymax < ymin)
+  known_size = (width > 0) & (height > 0)
+  return {
+    'inverted': inverted,
+    'zero_area': ~inverted & ((xmax == xmin) | (ymax == ymin)),
+    'out_of_bounds': known_size & ((xmin < 0) | (ymin < 0) | (xmax > width) | (ymax > height)),
+  }
+
+def invalid_boxes(boxes: np.ndarray) -> np.ndarray:
+  # 反向或面積為零的框，即 BOX_ERRORS
+  checks = check_boxes(boxes, 0, 0)
+  return np.logical_or.reduce([checks[name] for name in BOX_ERRORS])
+
+def normalize_boxes(boxes: np.ndarray, width: int, height: int) -> tuple:
+  # 回傳 (normalized, valid)，座標裁切至 [0, 1]，裁切後面積為零或反向的框標記為無效
+  scale = np.array([width, height, width, height], dtype=np.float32)
+  normalized = np.clip(boxes / scale, 0.0, 1.0)
+  valid = (normalized[:, 2] > normalized[:, 0]) & (normalized[:, 3] > normalized[:, 1])
+  return normalized, valid
+
+def validation_report(files: list, boxes_per_file: list, sizes: list, errors: list = None, max_examples: int = 5) -> dict:
+  # errors 與 files 對應，無法讀取的檔案為錯誤訊息，其餘為 None；unreadable_files 為完整清單
+  errors = errors or [None] * len(files)
+  unreadable = [(file, error) for file, error in zip(files, errors) if error]
+  counts = np.array([len(boxes) for boxes in boxes_per_file], dtype=np.int64)
+  report = {'files': len(files), 'boxes': int(counts.sum()), 'unreadable': len(unreadable),
+            'unreadable_files': [file for file, _ in unreadable], 'examples': {}}
+  if unreadable:
+    report['examples']['unreadable'] = [f'{file} ({error})' for file, error in unreadable[:max_examples]]
+  if not report['boxes']:
+    return {**report, **{name: 0 for name in BOX_ERRORS + BOX_WARNINGS}}
+
+  sizes = np.asarray(sizes, dtype=np.float32).reshape(-1, 2)
+  file_index = np.repeat(np.arange(len(files)), counts)
+  checks = check_boxes(
+    np.concatenate(boxes_per_file), np.repeat(sizes[:, 0], counts), np.repeat(sizes[:, 1], counts))
+
+  for name, mask in checks.items():
+    report[name] = int(mask.sum())
+    if report[name]:
+      report['examples'][name] = [files[index] for index in np.unique(file_index[mask])[:max_examples]]
+  return report
+
+def has_box_errors(report: dict) -> bool:
+  return any(report[name] for name in BOX_ERRORS)
+
+def format_report(report: dict) -> str:
+  lines = [f'檢查 {report["files"]} 個標註檔、{report["boxes"]} 個標註框: '
+           + ', '.join(f'{name} {report.get(name, 0)}' for name in BOX_ERRORS + BOX_WARNINGS + FILE_ERRORS)]
+  for name, examples in report['examples'].items():
+    lines.append(f'  {name}: ' + ', '.join(examples))
+  return '\n'.join(lines)
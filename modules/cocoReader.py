@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+from array import array
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+
+try:
+  import ijson
+except ImportError:
+  ijson = None
+
+
+# COCO 格式中每張影像以 "<標註檔路徑>#<image_id>" 表示，其餘流程與單張標註檔相同
+SOURCE_SEPARATOR = '#'
+# 索引快取不寫入資料集資料夾（可能唯讀或共用），依標註檔路徑存於 .cache/ 下
+CACHE_DIR = Path('.cache') / 'coco_index'
+
+def is_coco_source(source: str) -> bool:
+  json_path, _, image_id = source.rpartition(SOURCE_SEPARATOR)
+  return json_path.endswith('.json') and image_id.lstrip('-').isdigit()
+
+def split_source(source: str) -> tuple:
+  json_path, image_id = source.rsplit(SOURCE_SEPARATOR, 1)
+  return json_path, int(image_id)
+
+# 建立索引需要的欄位；串流解析時只保留這些欄位，其餘（例如 segmentation）略過
+SECTION_FIELDS = {
+  'images': ('id', 'file_name', 'width', 'height'),
+  'annotations': ('image_id', 'category_id', 'bbox'),
+  'categories': ('id', 'name'),
+}
+
+def read_sections(json_path: str, collectors: dict) -> None:
+  # 將 images、annotations、categories 的每一筆交給對應的 collectors[區段]
+  # 有 ijson 時以單次串流解析依檔案中的順序分派，不需將整份標註檔載入記憶體，也不重複讀檔
+  if ijson is None:
+    print(f'ijson is not installed, loading {json_path} with json.load')
+    with open(json_path, 'r', encoding='utf8') as fid:
+      data = json.load(fid)
+    for section, collect in collectors.items():
+      for item in data.get(section, []):
+        collect(item)
+    return
+
+  items = {f'{section}.item': collect for section, collect in collectors.items()}
+  fields = {f'{section}.item.{name}': name for section in collectors for name in SECTION_FIELDS[section]}
+  elements = {f'{prefix}.item': name for prefix, name in fields.items()}
+  item = None
+  with open(json_path, 'rb') as fid:
+    for prefix, event, value in ijson.parse(fid, use_float=True):
+      name = fields.get(prefix)
+      if name is not None:
+        if event == 'start_array':
+          item[name] = []
+        elif event not in ('end_array', 'start_map', 'end_map'):
+          item[name] = value
+        continue
+      name = elements.get(prefix)
+      if name is not None:
+        item[name].append(value)
+      elif prefix in items:
+        if event == 'start_map':
+          item = {}
+        elif event == 'end_map':
+          items[prefix](item)
+
+def build_coco_index(json_path: str) -> dict:
+  # 以緊湊陣列建立 image_id -> annotations 的索引，annotations 依 image_id 排序並以 offsets 切分
+  # annotations 數量可達數百萬筆，以 array 累積數值，不保留逐筆的 dict
+  images, categories = [], []
+  ann_image, ann_category, ann_bbox = array('q'), array('q'), array('f')
+
+  def add_annotation(annotation):
+    ann_image.append(annotation['image_id'])
+    ann_category.append(annotation['category_id'])
+    ann_bbox.extend(annotation['bbox'][:4])
+
+  read_sections(json_path, {
+    'images': lambda image: images.append(
+      (image['id'], image['file_name'], image.get('width', 0), image.get('height', 0))),
+    'annotations': add_annotation,
+    'categories': lambda category: categories.append((category['id'], category['name'])),
+  })
+  images.sort()
+  image_ids = np.array([image[0] for image in images], dtype=np.int64)
+
+  ann_image = np.frombuffer(ann_image, dtype=np.int64)
+  order = np.argsort(ann_image, kind='stable')
+  ann_bbox = np.frombuffer(ann_bbox, dtype=np.float32).reshape(-1, 4)[order]
+  # COCO bbox 為 [x, y, width, height]，轉為 xmin, ymin, xmax, ymax
+  ann_bbox[:, 2:] += ann_bbox[:, :2]
+
+  categories.sort()
+  return {
+    'image_ids': image_ids,
+    'file_names': np.array([image[1] for image in images], dtype=np.str_),
+    'widths': np.array([image[2] for image in images], dtype=np.int32),
+    'heights': np.array([image[3] for image in images], dtype=np.int32),
+    'offsets': np.searchsorted(ann_image[order], image_ids, side='left'),
+    'ends': np.searchsorted(ann_image[order], image_ids, side='right'),
+    'categories': np.frombuffer(ann_category, dtype=np.int64)[order],
+    'boxes': ann_bbox,
+    'category_ids': np.array([category[0] for category in categories], dtype=np.int64),
+    'category_names': np.array([category[1] for category in categories], dtype=np.str_),
+  }
+
+def index_cache_path(json_path: str) -> Path:
+  return CACHE_DIR / f'{hashlib.sha1(str(Path(json_path).absolute()).encode("utf8")).hexdigest()}.npz'
+
+@lru_cache(maxsize=8)
+def load_coco_index(json_path: str, size: int, mtime_ns: int) -> dict:
+  # 標註檔大小或修改時間改變時重建並覆寫同一個快取檔；每個進程只載入一次
+  cache_path = index_cache_path(json_path)
+  try:
+    with np.load(cache_path) as cached:
+      if int(cached['source_size']) == size and int(cached['source_mtime_ns']) == mtime_ns:
+        return {name: cached[name] for name in cached.files if not name.startswith('source_')}
+  except (OSError, ValueError, KeyError):
+    pass
+
+  index = build_coco_index(json_path)
+  try:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as fid:
+      np.savez(fid, source_size=size, source_mtime_ns=mtime_ns, **index)
+    os.replace(tmp_path, cache_path)
+  except OSError as e:
+    print(f'Cannot cache COCO index for {json_path}: {e}')
+  return index
+
+def coco_index(json_path: str) -> dict:
+  stat = os.stat(json_path)
+  return load_coco_index(str(json_path), stat.st_size, stat.st_mtime_ns)
+
+def coco_sources(json_path: str) -> list:
+  return [f'{json_path}{SOURCE_SEPARATOR}{image_id}' for image_id in coco_index(json_path)['image_ids']]
+
+def image_position(index: dict, image_id: int) -> int:
+  position = int(np.searchsorted(index['image_ids'], image_id))
+  if position >= len(index['image_ids']) or index['image_ids'][position] != image_id:
+    raise ValueError(f'Image id {image_id} not found in COCO annotations')
+  return position
+
+def resolve_image_path(json_path: str, file_name: str) -> str:
+  # 依序嘗試標註檔同層、同層 images/、上一層 images/（annotations/ 與 images/ 並列的常見結構）
+  json_dir = Path(json_path).parent
+  candidates = [json_dir / file_name, json_dir / 'images' / file_name, json_dir.parent / 'images' / file_name]
+  for candidate in candidates:
+    if candidate.exists():
+      return str(candidate)
+  return str(candidates[0])
+
+def coco_image_path(source: str) -> str:
+  json_path, image_id = split_source(source)
+  index = coco_index(json_path)
+  return resolve_image_path(json_path, str(index['file_names'][image_position(index, image_id)]))
+
+def read_coco(source: str) -> dict:
+  # 回傳與 read_voc 相同的扁平格式：{'filename', 'width', 'height', 'labels', 'boxes'}
+  json_path, image_id = split_source(source)
+  index = coco_index(json_path)
+  position = image_position(index, image_id)
+  start, end = index['offsets'][position], index['ends'][position]
+
+  category_positions = np.searchsorted(index['category_ids'], index['categories'][start:end])
+  if len(category_positions) and (category_positions.max() >= len(index['category_ids'])
+                                  or np.any(index['category_ids'][category_positions] != index['categories'][start:end])):
+    raise ValueError(f'Unknown category id in annotations of image {image_id}: {json_path}')
+
+  return {
+    'filename': str(index['file_names'][position]),
+    'width': int(index['widths'][position]),
+    'height': int(index['heights'][position]),
+    'labels': [str(name) for name in index['category_names'][category_positions]],
+    'boxes': index['boxes'][start:end],
+  }
@@ -0,0 +1,136 @@
+import os
+import time
+import queue
+import psutil
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# 取樣記憶體用量的最短間隔（秒）
+RSS_SAMPLE_INTERVAL = 0.5
+
+def rss_mb(pids: list) -> list:
+  # 各進程目前的 RSS，單位 MB；已結束的進程略過
+  sizes = []
+  for pid in pids:
+    try:
+      sizes.append(psutil.Process(pid).memory_info().rss / 1024 / 1024)
+    except psutil.Error:
+      pass
+  return sizes
+
+def report_pid(pids) -> None:
+  # 編碼進程啟動時回報自己的 pid，供記憶體取樣使用
+  pids.put(os.getpid())
+
+class ConversionPipeline:
+  # 讀取（執行緒）-> 編碼（進程）-> 單一寫入端，三個階段之間以記憶體預算限制同時處理中的項目
+  # 每個項目自開始讀取到寫入完成都佔用 cost(item) bytes 的預算，預算用盡時暫停讀取，峰值記憶體因此可預期
+  def __init__(self, read, encode, cost, num_readers: int = 4, num_encoders: int = 1, budget_mb: float = 1024):
+    self.read = read
+    self.encode = encode
+    self.cost = cost
+    self.num_readers = max(1, num_readers)
+    self.num_encoders = num_encoders
+    self.budget = int(budget_mb * 1024 * 1024)
+    self.used = 0
+    self.peak_used = 0
+    self.writer_stall = 0.0
+    self.budget_stall = 0.0
+    self.full_since = None
+    self.peak_main_rss = 0.0
+    self.peak_worker_rss = 0.0
+    self.sampled_at = None
+    self.worker_pids = set()
+
+  def stage(self, encoder, item):
+    # 讀取執行緒讀入影像後直接交給編碼進程，不等待編碼完成
+    payload = self.read(item)
+    if encoder is None:
+      return payload
+    return encoder.submit(self.encode, item, payload)
+
+  def sample_rss(self, pids, force: bool = False) -> None:
+    # 只量測本進程與這個管線的編碼進程；長時間執行的網頁伺服器中其他子進程（例如訓練）不計入
+    now = time.monotonic()
+    if not force and self.sampled_at is not None and now - self.sampled_at < RSS_SAMPLE_INTERVAL:
+      return
+    self.sampled_at = now
+    while pids is not None:
+      try:
+        self.worker_pids.add(pids.get_nowait())
+      except queue.Empty:
+        break
+    self.peak_main_rss = max([self.peak_main_rss, *rss_mb([os.getpid()])])
+    self.peak_worker_rss = max([self.peak_worker_rss, *rss_mb(self.worker_pids)])
+
+  @staticmethod
+  def cancel(pending) -> None:
+    # 取消尚未開始的讀取，以及已交給編碼進程但尚未開始的項目
+    for _, future in pending:
+      if future.cancel() or future.exception() is not None:
+        continue
+      if hasattr(future.result(), 'cancel'):
+        future.result().cancel()
+
+  def run(self, items: list):
+    # 依輸入順序產生 (result, error)；單一項目讀取或編碼失敗時 error 為例外，管線繼續處理後續項目
+    pids, encoder = None, None
+    if self.num_encoders > 1:
+      pids = multiprocessing.Queue()
+      encoder = ProcessPoolExecutor(max_workers=self.num_encoders, initializer=report_pid, initargs=(pids,))
+    readers = ThreadPoolExecutor(max_workers=self.num_readers)
+    pending = deque()
+    next_index, next_cost = 0, None
+    try:
+      for item in items:
+        # 預算允許時盡量往後送出讀取；即使單一項目超過預算，管線為空時仍會送出以免停住
+        if self.full_since is not None:
+          self.budget_stall += time.monotonic() - self.full_since
+          self.full_since = None
+        while next_index < len(items):
+          if next_cost is None:
+            next_cost = self.cost(items[next_index])
+          if pending and self.used + next_cost > self.budget:
+            self.full_since = time.monotonic()
+            break
+          pending.append((next_cost, readers.submit(self.stage, encoder, items[next_index])))
+          self.used += next_cost
+          self.peak_used = max(self.peak_used, self.used)
+          next_index, next_cost = next_index + 1, None
+
+        cost, future = pending.popleft()
+        start = time.monotonic()
+        result, error = None, None
+        try:
+          result = future.result()
+          if encoder is not None:
+            result = result.result()
+          self.writer_stall += time.monotonic() - start
+          if encoder is None:
+            result = self.encode(item, result)
+        except BrokenProcessPool:
+          # 編碼進程異常結束（例如記憶體不足被終止），後續項目都無法處理
+          raise
+        except Exception as e:
+          result, error = None, e
+        self.sample_rss(pids)
+        yield result, error
+        self.used -= cost
+    finally:
+      self.sample_rss(pids, force=True)
+      # Python 3.8 的 shutdown 沒有 cancel_futures，自行取消
+      self.cancel(pending)
+      readers.shutdown(wait=True)
+      if encoder is not None:
+        encoder.shutdown(wait=True)
+        pids.close()
+
+  def summary(self) -> str:
+    rss = f'peak RSS {self.peak_main_rss:.0f} MB main'
+    if self.peak_worker_rss:
+      rss += f' / {self.peak_worker_rss:.0f} MB largest worker'
+    return (f'{rss}, peak in-flight {self.peak_used / 1024 / 1024:.0f} of {self.budget / 1024 / 1024:.0f} MB budget, '
+            f'writer waited {self.writer_stall:.1f}s for input, readers waited {self.budget_stall:.1f}s for budget')
@@ -0,0 +1,68 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+HISTORY_NAME = 'conversion_history.jsonl'
+
+class ConversionProgress:
+  # 累計轉換進度，event() 回傳可序列化的進度事件
+  # total 為這次需要處理的檔案數；reused 為 manifest 中未變動而沿用的檔案，resumed 為 journal 中已提交的檔案，
+  # skipped 只計入失敗而未寫入的檔案
+  def __init__(self, record_type: str, total: int, reused: int = 0, skipped: int = 0):
+    self.record_type = record_type
+    self.total = total
+    self.reused = reused
+    self.resumed = 0
+    self.skipped = skipped
+    self.done = 0
+    self.processed = 0
+    self.bytes_written = 0
+    self.start = time.monotonic()
+
+  def resume(self, committed: int, skipped: int) -> None:
+    # journal 中已提交 committed 筆，其中 skipped 筆是上次失敗的檔案
+    self.total -= committed
+    self.resumed += committed - skipped
+    self.skipped += skipped
+
+  def update(self, num_bytes: int) -> None:
+    self.done += 1
+    self.processed += 1
+    self.bytes_written += num_bytes
+
+  def skip(self) -> None:
+    self.skipped += 1
+    self.processed += 1
+
+  def event(self, finished: bool = False) -> dict:
+    elapsed = time.monotonic() - self.start
+    processed = self.processed
+    images_per_sec = processed / elapsed if elapsed > 0 else 0.0
+    remaining = self.total - processed
+    return {
+      'record_type': self.record_type,
+      'done': self.done,
+      'total': self.total,
+      'reused': self.reused,
+      'resumed': self.resumed,
+      'skipped': self.skipped,
+      'elapsed': elapsed,
+      'images_per_sec': images_per_sec,
+      'mb_per_sec': self.bytes_written / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+      'eta': remaining / images_per_sec if images_per_sec > 0 else None,
+      'finished': finished,
+    }
+
+def format_progress(event: dict) -> str:
+  eta = '--' if event['eta'] is None else f'{event["eta"]:.0f}s'
+  return (f'{event["record_type"]}: {event["done"]}/{event["total"]} images, '
+          f'{event["images_per_sec"]:.1f} img/s, {event["mb_per_sec"]:.1f} MB/s, ETA {eta}, '
+          f'reused {event["reused"]}, resumed {event["resumed"]}, skipped {event["skipped"]}')
+
+def record_run(save_dir: str, event: dict, **settings) -> None:
+  # 每次轉換的最終數據附加到歷史紀錄，方便比較不同設定下的轉換速度
+  run = {'time': datetime.now().isoformat(timespec='seconds'), **settings, **event}
+  with open(Path(save_dir) / HISTORY_NAME, 'a', encoding='utf8') as fid:
+    fid.write(json.dumps(run, ensure_ascii=False) + '\n')
@@ -0,0 +1,84 @@
+from pathlib import Path
+import numpy as np
+
+
+STATS_SUFFIX = '.stats.npz'
+# 標註框大小以 sqrt(正規化面積) 分組
+BOX_SIZE_BINS = np.linspace(0.0, 1.0, 11)
+OBJECT_COUNT_BINS = np.array([0, 1, 2, 3, 5, 10, 20, 50, 100, np.inf])
+
+def stats_path(save_dir: str, record_type: str) -> Path:
+  return Path(save_dir) / f'{record_type}{STATS_SUFFIX}'
+
+def example_columns(width: int, height: int, classes: list, box_width: np.ndarray, box_height: np.ndarray) -> dict:
+  # 轉換時每筆紀錄附帶的統計欄位，由寫入端串接後存入索引檔
+  return {
+    'width': np.array([width], dtype=np.int32),
+    'height': np.array([height], dtype=np.int32),
+    'class': np.asarray(classes, dtype=np.int32),
+    'box_width': np.asarray(box_width, dtype=np.float32),
+    'box_height': np.asarray(box_height, dtype=np.float32),
+  }
+
+def concat_columns(columns_list: list) -> dict:
+  if not columns_list:
+    return {}
+  return {name: np.concatenate([columns[name] for columns in columns_list]) for name in columns_list[0]}
+
+def compute_statistics(dataset_index, label_map_dict: dict) -> dict:
+  columns = concat_columns([shard.columns for shard in dataset_index.shards if 'class' in shard.columns])
+  names = sorted(label_map_dict, key=label_map_dict.get)
+  if not columns:
+    columns = {name: np.zeros(0) for name in ('width', 'height', 'class', 'box_width', 'box_height')}
+
+  objects = np.concatenate([shard.objects for shard in dataset_index.shards]) if dataset_index.shards else np.zeros(0)
+  box_size = np.sqrt(np.clip(columns['box_width'] * columns['box_height'], 0.0, 1.0))
+  resolutions, resolution_counts = (
+    np.unique(np.stack([columns['width'], columns['height']], axis=1), axis=0, return_counts=True)
+    if len(columns['width']) else (np.zeros((0, 2), dtype=np.int32), np.zeros(0, dtype=np.int64)))
+
+  return {
+    'num_images': np.array(len(dataset_index)),
+    'class_names': np.asarray(names, dtype=np.str_),
+    'class_counts': np.bincount(columns['class'].astype(np.int64), minlength=len(names) + 1)[1:len(names) + 1],
+    'box_size_bins': BOX_SIZE_BINS,
+    'box_size_hist': np.histogram(box_size, bins=BOX_SIZE_BINS)[0],
+    'object_count_bins': OBJECT_COUNT_BINS,
+    'object_count_hist': np.histogram(objects, bins=OBJECT_COUNT_BINS)[0],
+    'resolutions': resolutions,
+    'resolution_counts': resolution_counts,
+  }
+
+def save_statistics(save_dir: str, record_type: str, stats: dict) -> None:
+  with open(stats_path(save_dir, record_type), 'wb') as fid:
+    np.savez(fid, **stats)
+
+def load_statistics(save_dir: str, record_type: str) -> dict:
+  path = stats_path(save_dir, record_type)
+  if not path.exists():
+    return None
+  with np.load(path) as stats:
+    return {name: stats[name] for name in stats.files}
+
+def format_bar(count: int, total: int, width: int = 20) -> str:
+  filled = round(width * count / total) if total else 0
+  return '█' * filled
+
+def format_statistics(stats: dict, record_type: str) -> str:
+  lines = [f'### {record_type} ({int(stats["num_images"])} 張影像)', '', '| 類別 | 物件數 |', '|---|---|']
+  lines += [f'| {name} | {count} |' for name, count in zip(stats['class_names'], stats['class_counts'])]
+
+  lines += ['', '| 標註框大小 (sqrt 面積) | 數量 | |', '|---|---|---|']
+  bins, hist = stats['box_size_bins'], stats['box_size_hist']
+  lines += [f'| {bins[i]:.1f} - {bins[i + 1]:.1f} | {count} | {format_bar(count, hist.max())} |' for i, count in enumerate(hist)]
+
+  lines += ['', '| 每張影像物件數 | 影像數 | |', '|---|---|---|']
+  bins, hist = stats['object_count_bins'], stats['object_count_hist']
+  for i, count in enumerate(hist):
+    upper = '以上' if np.isinf(bins[i + 1]) else f'- {int(bins[i + 1]) - 1}'
+    lines.append(f'| {int(bins[i])} {upper} | {count} | {format_bar(count, hist.max())} |')
+
+  lines += ['', '| 解析度 | 影像數 |', '|---|---|']
+  order = np.argsort(-stats['resolution_counts'])[:10]
+  lines += [f'| {stats["resolutions"][i][0]} x {stats["resolutions"][i][1]} | {stats["resolution_counts"][i]} |' for i in order]
+  return '\n'.join(lines)
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+CACHE_DIR = Path('.cache') / 'file_scan'
+# 最近一次 get_all_files 配對到的影像路徑，同一進程內 image_path_for 直接查表
+# 每次列出檔案時整份取代，網頁伺服器長時間執行也只保留目前資料集，檔案移動後不會查到舊的配對
+PAIRED_IMAGES = {}
+
+def cache_path(directory: str) -> Path:
+  return CACHE_DIR / f'{hashlib.sha1(directory.encode("utf8")).hexdigest()}.json'
+
+def load_cache(directory: str) -> dict:
+  path = cache_path(directory)
+  if not path.exists():
+    return {}
+  try:
+    with open(path, 'r', encoding='utf8') as fid:
+      return json.load(fid)
+  except (OSError, ValueError):
+    return {}
+
+def save_cache(directory: str, listing: dict) -> None:
+  try:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path(directory).with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf8') as fid:
+      json.dump(listing, fid, ensure_ascii=False)
+    os.replace(tmp_path, cache_path(directory))
+  except OSError as e:
+    print(f'Cannot save file scan cache for {directory}: {e}')
+
+def list_directory(path: str, cached: dict) -> dict:
+  # 資料夾的 mtime 未變時沿用快取，不重新列出內容；新增、刪除或更名檔案都會改變 mtime
+  mtime_ns = os.stat(path).st_mtime_ns
+  if cached and cached.get('mtime_ns') == mtime_ns:
+    return cached
+
+  files, subdirs = [], []
+  with os.scandir(path) as entries:
+    for entry in entries:
+      if entry.is_dir(follow_symlinks=True):
+        subdirs.append(entry.name)
+      elif entry.is_file(follow_symlinks=True):
+        files.append(entry.name)
+  return {'mtime_ns': mtime_ns, 'files': sorted(files), 'subdirs': sorted(subdirs)}
+
+def walk(directory: str, num_threads: int = 16) -> dict:
+  # 逐層平行列出資料夾，網路磁碟上的延遲可互相重疊；回傳 {相對路徑: listing}
+  directory = str(Path(directory).absolute())
+  cached = load_cache(directory)
+  listing, level = {}, ['.']
+  with ThreadPoolExecutor(max_workers=num_threads) as executor:
+    while level:
+      results = executor.map(lambda relative: list_directory(os.path.join(directory, relative), cached.get(relative)), level)
+      next_level = []
+      for relative, result in zip(level, results):
+        listing[relative] = result
+        next_level.extend(os.path.normpath(os.path.join(relative, name)) for name in result['subdirs'])
+      level = next_level
+
+  if listing != cached:
+    save_cache(directory, listing)
+  return listing
+
+def pair_files(folder: str, files: list, file_format: str) -> tuple:
+  # 同一資料夾內以檔名主幹配對標註檔與影像，副檔名不限 .jpg
+  images = {}
+  for name in files:
+    stem, ext = os.path.splitext(name)
+    if ext.lower() in IMAGE_EXTENSIONS:
+      current = images.get(stem)
+      if current is None or IMAGE_EXTENSIONS.index(ext.lower()) < IMAGE_EXTENSIONS.index(os.path.splitext(current)[1].lower()):
+        images[stem] = name
+
+  pairs, unpaired = [], []
+  for name in files:
+    stem, ext = os.path.splitext(name)
+    if ext.lower() != f'.{file_format}':
+      continue
+    annotation_path = os.path.join(folder, name)
+    if stem in images:
+      pairs.append((annotation_path, os.path.join(folder, images[stem])))
+    else:
+      unpaired.append(annotation_path)
+  return pairs, unpaired
+
+def scan_dataset(directory: str, file_format: str, num_threads: int = 16) -> tuple:
+  # 回傳 (pairs, unpaired)：pairs 為 (標註檔, 影像) 的絕對路徑，unpaired 為找不到影像的標註檔
+  directory = str(Path(directory).absolute())
+  if not os.path.isdir(directory):
+    return [], []
+
+  pairs, unpaired = [], []
+  for relative, result in sorted(walk(directory, num_threads).items()):
+    folder_pairs, folder_unpaired = pair_files(os.path.normpath(os.path.join(directory, relative)), result['files'], file_format)
+    pairs.extend(folder_pairs)
+    unpaired.extend(folder_unpaired)
+  return pairs, unpaired
+
+def use_pairs(pairs: list) -> None:
+  # 以 scan_dataset 的結果取代 find_image 查詢的配對表
+  PAIRED_IMAGES.clear()
+  PAIRED_IMAGES.update(pairs)
+
+def find_image(annotation_path: str) -> str:
+  # 子進程或未經掃描的檔案：依副檔名順序尋找同名影像
+  if annotation_path in PAIRED_IMAGES:
+    return PAIRED_IMAGES[annotation_path]
+  stem = os.path.splitext(annotation_path)[0]
+  for ext in IMAGE_EXTENSIONS:
+    for candidate in (stem + ext, stem + ext.upper()):
+      if os.path.exists(candidate):
+        return candidate
+  return stem + '.jpg'
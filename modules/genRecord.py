@@ -1,20 +1,55 @@
 import io
+import os
 import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+from types import MappingProxyType
+import numpy as np
 import PIL.Image
 import tensorflow as tf
-from lxml import etree
 from object_detection.protos import string_int_label_map_pb2
 from object_detection.utils import dataset_util
+from modules.recordManifest import assign_shards, file_stat, load_manifest, save_manifest, plan_shards, relative_source
+from modules.conversionProgress import ConversionProgress, record_run
+from modules.boxUtil import annotation_boxes, annotation_size, invalid_boxes, normalize_boxes, validation_report
+from modules.imageUtil import resize_jpeg
+from modules.recordIndex import DatasetIndex, index_path, write_index
+from modules.vocReader import read_voc
+from modules.cocoReader import coco_sources, coco_image_path, is_coco_source, read_coco, split_source
+from modules.datasetStats import example_columns, concat_columns, compute_statistics, save_statistics
+from modules.fileScan import scan_dataset, find_image, use_pairs
+from modules.conversionPipeline import ConversionPipeline
+from modules.recordJournal import RecordJournal, ResumableRecordWriter, journal_key, remove_journal, skipped_path
+from modules.aspectBucket import ASPECT_BUCKETS, bucket_names, format_padding, image_sizes
 
 
 def get_all_files(directory: str, folders: list, file_format: str):
-  all_files = []
+  # 以 scan_dataset 列出檔案，同時配對影像；資料夾未變動時直接使用快取的清單
+  all_files, all_pairs = [], []
   for folder in folders:
     folder_path = Path(directory) / folder
-    all_files.extend(str(file.absolute()) for file in folder_path.glob(f'**/*.{file_format}'))
+    if file_format == 'coco':
+      # 一份 COCO 標註檔內含多張影像，每張影像展開為一個來源
+      pairs, unpaired = scan_dataset(str(folder_path), 'json')
+      for annotation_file in sorted([annotation for annotation, _ in pairs] + unpaired):
+        all_files.extend(coco_sources(annotation_file))
+      continue
+    pairs, unpaired = scan_dataset(str(folder_path), file_format)
+    if unpaired:
+      print(f'{len(unpaired)} annotation files without a matching image in {folder_path}, e.g. {unpaired[0]}')
+    all_files.extend(annotation for annotation, _ in pairs)
+    all_files.extend(unpaired)
+    all_pairs.extend(pairs)
+  use_pairs(all_pairs)
   return all_files
 
+def image_path_for(file: str) -> str:
+  if is_coco_source(file):
+    return coco_image_path(file)
+  return find_image(file)
+
 def create_folder(directory):
   try:
     directory = Path(directory) if isinstance(directory, str) else directory
@@ -22,13 +57,37 @@ def create_folder(directory):
   except Exception as e:
     print(f'Error: Creating directory. {e}')
 
-def dict_to_tf_example_with_json(data: dict, file_path: str, label_map_dict: dict):
+def read_image(file_path: str) -> bytes:
   try:
     with tf.io.gfile.GFile(file_path, 'rb') as fid:
-      encoded_img = fid.read()
+      return fid.read()
   except Exception as e:
     raise ValueError(f'Error reading image from {file_path}: {e}')
 
+def object_features(boxes: np.ndarray, labels: list, width: int, height: int, label_map_dict: dict,
+                    drop_invalid: bool = False) -> dict:
+  # 一次完成整張影像標註框的正規化與裁切；裁切後無效的框與不在 label_map_dict 內的類別不寫入
+  # 標註本身反向或面積為零時，drop_invalid 為 False 則整張影像失敗，不會默默略過
+  invalid = invalid_boxes(boxes)
+  if invalid.any() and not drop_invalid:
+    raise ValueError(f'{int(invalid.sum())} invalid boxes (inverted or zero area)')
+  normalized, valid = normalize_boxes(boxes, width, height)
+  keep = valid & np.array([label in label_map_dict for label in labels], dtype=bool)
+  kept_labels = [label for label, kept in zip(labels, keep) if kept]
+  return {
+    'image/object/bbox/xmin': dataset_util.float_list_feature(normalized[keep, 0].tolist()),
+    'image/object/bbox/xmax': dataset_util.float_list_feature(normalized[keep, 2].tolist()),
+    'image/object/bbox/ymin': dataset_util.float_list_feature(normalized[keep, 1].tolist()),
+    'image/object/bbox/ymax': dataset_util.float_list_feature(normalized[keep, 3].tolist()),
+    'image/object/class/text': dataset_util.bytes_list_feature([label.encode('utf8') for label in kept_labels]),
+    'image/object/class/label': dataset_util.int64_list_feature([label_map_dict[label] for label in kept_labels]),
+  }
+
+def dict_to_tf_example_with_json(data: dict, file_path: str, label_map_dict: dict, resize: list = None, encoded_img: bytes = None,
+                                 drop_invalid: bool = False):
+  if encoded_img is None:
+    encoded_img = read_image(file_path)
+
   encoded_img_io = io.BytesIO(encoded_img)
   try:
     image = PIL.Image.open(encoded_img_io)
@@ -39,50 +98,33 @@ def dict_to_tf_example_with_json(data: dict, file_path: str, label_map_dict: dic
     raise ValueError(f'Image format not JPEG: {file_path}')
 
   width, height = image.size
-  xmin, ymin, xmax, ymax = [], [], [], []
-  classes, classes_text = [], []
-
   try:
-    for obj in data['shapes']:
-      xmin.append(float(obj['points'][0][0]) / width)
-      ymin.append(float(obj['points'][0][1]) / height)
-      xmax.append(float(obj['points'][1][0]) / width)
-      ymax.append(float(obj['points'][1][1]) / height)
-      
-      label = obj['label']
-      if label not in label_map_dict:
-        label_map_dict[label] = len(label_map_dict) + 1
-
-      classes_text.append(label.encode('utf8'))
-      classes.append(label_map_dict[label])
-  except KeyError as e:
-    raise ValueError(f'Missing key in data: {e}')
+    boxes, labels = annotation_boxes(data, 'json')
   except Exception as e:
     raise ValueError(f'Error processing object annotations for {data.get("imagePath", "unknown file")}: {e}')
 
+  # 標註框以原始尺寸正規化，縮圖後不需調整座標
+  image_format = image.format.lower()
+  out_width, out_height = width, height
+  if resize:
+    encoded_img, out_width, out_height = resize_jpeg(image, encoded_img, *resize)
+
   example = tf.train.Example(features=tf.train.Features(feature={
-    'image/height': dataset_util.int64_feature(height),
-    'image/width': dataset_util.int64_feature(width),
+    'image/height': dataset_util.int64_feature(out_height),
+    'image/width': dataset_util.int64_feature(out_width),
     'image/filename': dataset_util.bytes_feature(data['imagePath'].encode('utf8')),
     'image/source_id': dataset_util.bytes_feature(data['imagePath'].encode('utf8')),
     'image/encoded': dataset_util.bytes_feature(encoded_img),
-    'image/format': dataset_util.bytes_feature(image.format.lower().encode('utf8')),
-    'image/object/bbox/xmin': dataset_util.float_list_feature(xmin),
-    'image/object/bbox/xmax': dataset_util.float_list_feature(xmax),
-    'image/object/bbox/ymin': dataset_util.float_list_feature(ymin),
-    'image/object/bbox/ymax': dataset_util.float_list_feature(ymax),
-    'image/object/class/text': dataset_util.bytes_list_feature(classes_text),
-    'image/object/class/label': dataset_util.int64_list_feature(classes),
+    'image/format': dataset_util.bytes_feature(image_format.encode('utf8')),
+    **object_features(boxes, labels, width, height, label_map_dict, drop_invalid),
   }))
     
   return example
 
-def dict_to_tf_example_with_xml(data: dict, file_path: str, label_map_dict: dict):
-  try:
-    with tf.io.gfile.GFile(file_path, 'rb') as fid:
-      encoded_img = fid.read()
-  except Exception as e:
-    raise ValueError(f'Error reading image file: {file_path}, Error: {e}')
+def dict_to_tf_example_with_xml(data: dict, file_path: str, label_map_dict: dict, resize: list = None, encoded_img: bytes = None,
+                                drop_invalid: bool = False):
+  if encoded_img is None:
+    encoded_img = read_image(file_path)
 
   encoded_img_io = io.BytesIO(encoded_img)
   image = PIL.Image.open(encoded_img_io)
@@ -90,66 +132,259 @@ def dict_to_tf_example_with_xml(data: dict, file_path: str, label_map_dict: dict
     raise ValueError(f'Image format not JPEG: {data["filename"]}')
 
   width, height = image.size
-  xmin, ymin, xmax, ymax = [], [], [], []
-  classes, classes_text = [], []
-
-  if 'object' in data.keys():
-    for obj in data['object']:
-      try:
-        xmin.append(float(obj['bndbox']['xmin']) / width)
-        ymin.append(float(obj['bndbox']['ymin']) / height)
-        xmax.append(float(obj['bndbox']['xmax']) / width)
-        ymax.append(float(obj['bndbox']['ymax']) / height)
-
-        label = obj['name']
-        if label not in label_map_dict:
-          label_map_dict[label] = len(label_map_dict) + 1
-
-        classes_text.append(label.encode('utf8'))
-        classes.append(label_map_dict[label])
-      except KeyError as e:
-        raise ValueError(f'Missing key {e} in object data: {data["filename"]}')
+  try:
+    boxes, labels = annotation_boxes(data, 'xml')
+  except ValueError as e:
+    raise ValueError(f'{e}: {data["filename"]}')
+
+  # 標註框以原始尺寸正規化，縮圖後不需調整座標
+  image_format = image.format.lower()
+  out_width, out_height = width, height
+  if resize:
+    encoded_img, out_width, out_height = resize_jpeg(image, encoded_img, *resize)
 
   # 生成 TF Example
   example = tf.train.Example(features=tf.train.Features(feature={
-    'image/height': dataset_util.int64_feature(height),
-    'image/width': dataset_util.int64_feature(width),
+    'image/height': dataset_util.int64_feature(out_height),
+    'image/width': dataset_util.int64_feature(out_width),
     'image/filename': dataset_util.bytes_feature(data['filename'].encode('utf8')),
     'image/source_id': dataset_util.bytes_feature(data['filename'].encode('utf8')),
     'image/encoded': dataset_util.bytes_feature(encoded_img),
-    'image/format': dataset_util.bytes_feature(image.format.lower().encode('utf8')),
-    'image/object/bbox/xmin': dataset_util.float_list_feature(xmin),
-    'image/object/bbox/xmax': dataset_util.float_list_feature(xmax),
-    'image/object/bbox/ymin': dataset_util.float_list_feature(ymin),
-    'image/object/bbox/ymax': dataset_util.float_list_feature(ymax),
-    'image/object/class/text': dataset_util.bytes_list_feature(classes_text),
-    'image/object/class/label': dataset_util.int64_list_feature(classes),
+    'image/format': dataset_util.bytes_feature(image_format.encode('utf8')),
+    **object_features(boxes, labels, width, height, label_map_dict, drop_invalid),
   }))
   
   return example
 
 
 
-def write_tf_example(save_path: str, all_files: list, label_map_dict: dict, file_format: str) -> None:
-  with tf.io.TFRecordWriter(save_path) as writer:
-    for idx, file in enumerate(all_files):
-      if idx % 100 == 0:
-        print(f'On image {idx} of {len(all_files)}')
-        yield print(f'On image {idx} of {len(all_files)}')
+def read_annotation(file: str, file_format: str) -> dict:
+  if file_format == 'xml':
+    return read_voc(file)
+  if file_format == 'coco':
+    return read_coco(file)
+
+  with open(file, 'r') as fid:
+    return json.load(fid)
+
+def scan_annotation(file: str, file_format: str) -> tuple:
+  # 回傳 (labels, boxes, size, error)，只解析標註檔，不讀取影像
+  # 單一標註檔損壞時 error 為錯誤訊息，不中止整個掃描
+  try:
+    data = read_annotation(file, file_format)
+    boxes, labels = annotation_boxes(data, file_format)
+  except Exception as e:
+    return [], np.zeros((0, 4), dtype=np.float32), (0, 0), f'{type(e).__name__}: {e}'
+  return labels, boxes, annotation_size(data, file_format), None
+
+def pool_chunksize(num_files: int, num_workers: int) -> int:
+  return max(1, min(64, num_files // (num_workers * 8)))
+
+def scan_annotations(all_files: list, file_format: str, num_workers: int = 1) -> list:
+  if num_workers <= 1:
+    return [scan_annotation(file, file_format) for file in all_files]
+  with ProcessPoolExecutor(max_workers=num_workers) as executor:
+    return list(executor.map(
+      partial(scan_annotation, file_format=file_format), all_files, chunksize=pool_chunksize(len(all_files), num_workers)))
+
+def scan_labels(all_files: list, file_format: str, num_workers: int = 1) -> tuple:
+  # 回傳 (labels, unreadable)，unreadable 為無法讀取的標註檔
+  scanned = scan_annotations(all_files, file_format, num_workers)
+  labels = {label for file_labels, _, _, _ in scanned for label in file_labels}
+  return labels, [file for file, (_, _, _, error) in zip(all_files, scanned) if error]
+
+def build_label_map(labels: set, training_classes: list = None) -> MappingProxyType:
+  # 有設定 training_classes 時依其順序編號，否則依類別名稱排序，重複執行結果一致
+  names = list(dict.fromkeys(training_classes)) if training_classes else sorted(labels)
+  return MappingProxyType({name: index for index, name in enumerate(names, start=1)})
+
+def prepare_label_map(target_dirs: list, file_format: str, num_workers: int = None, training_classes: list = None) -> tuple:
+  # 第一階段掃描：回傳 (label_map, ignored, report)
+  # ignored 為資料集中有但不在 training_classes 內的類別，report 為寫入前的標註框檢查結果
+  if num_workers is None:
+    num_workers = os.cpu_count() or 1
+  all_files = [file for target_dir in target_dirs for file in get_all_files(target_dir, [''], file_format)]
+  scanned = scan_annotations(all_files, file_format, num_workers)
+  labels = {label for file_labels, _, _, _ in scanned for label in file_labels}
+  label_map = build_label_map(labels, training_classes)
+  report = validation_report(all_files, [boxes for _, boxes, _, _ in scanned], [size for _, _, size, _ in scanned],
+                             [error for _, _, _, error in scanned])
+  return label_map, sorted(labels - set(label_map)), report
+
+def example_statistics(tf_example: tf.train.Example) -> dict:
+  feature = tf_example.features.feature
+  box = {name: np.array(feature[f'image/object/bbox/{name}'].float_list.value, dtype=np.float32)
+         for name in ('xmin', 'xmax', 'ymin', 'ymax')}
+  return example_columns(
+    feature['image/width'].int64_list.value[0], feature['image/height'].int64_list.value[0],
+    feature['image/object/class/label'].int64_list.value,
+    box['xmax'] - box['xmin'], box['ymax'] - box['ymin'])
+
+def encode_tf_example(file: str, file_format: str, label_map_dict: dict, resize: list = None, encoded_img: bytes = None,
+                      drop_invalid: bool = False) -> tuple:
+  # 回傳 (serialized, columns)，columns 為寫入索引檔的統計欄位
+  data = read_annotation(file, file_format)
+  image_path = image_path_for(file)
+  if file_format in ('xml', 'coco'):
+    # COCO 與 VOC 讀取後皆為相同的扁平格式
+    tf_example = dict_to_tf_example_with_xml(data, image_path, label_map_dict, resize, encoded_img, drop_invalid)
+  elif file_format == 'json':
+    tf_example = dict_to_tf_example_with_json(data, image_path, label_map_dict, resize, encoded_img, drop_invalid)
+  else:
+    raise ValueError(f'Unsupported dataset format: {file_format}')
+  return tf_example.SerializeToString(), example_statistics(tf_example)
+
+def encode_source(file: str, encoded_img: bytes, file_format: str, label_map_dict: dict, resize: list = None,
+                  drop_invalid: bool = False) -> tuple:
+  return encode_tf_example(file, file_format, label_map_dict, resize, encoded_img, drop_invalid)
+
+def example_cost(file: str, resize: list = None) -> int:
+  # 估計單筆在管線中佔用的記憶體：讀入的影像、傳給編碼進程的複本與序列化結果，縮圖時另加解碼後的像素
+  image_path = image_path_for(file)
+  num_bytes = os.path.getsize(image_path) if os.path.exists(image_path) else 0
+  cost = 3 * num_bytes
+  if resize and num_bytes:
+    try:
+      with PIL.Image.open(image_path) as image:
+        # 只讀取檔頭取得尺寸，不解碼
+        cost += image.size[0] * image.size[1] * 3
+    except Exception:
+      pass
+  return cost
+
+def conversion_pipeline(label_map_dict: dict, file_format: str, num_workers: int = 1, resize: list = None,
+                        memory_budget_mb: float = 1024, drop_invalid: bool = False) -> ConversionPipeline:
+  # MappingProxyType 無法 pickle，傳給子進程時改用一般 dict 複本
+  return ConversionPipeline(
+    read=lambda file: read_image(image_path_for(file)),
+    encode=partial(encode_source, file_format=file_format, label_map_dict=dict(label_map_dict), resize=resize,
+                   drop_invalid=drop_invalid),
+    cost=partial(example_cost, resize=resize),
+    num_readers=min(8, max(2, num_workers)),
+    num_encoders=num_workers,
+    budget_mb=memory_budget_mb)
 
-      if file_format == 'xml':
-        with tf.io.gfile.GFile(file, 'r') as fid:
-          xml_str = fid.read()
-        xml = etree.fromstring(xml_str)
-        data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
-        tf_example = dict_to_tf_example_with_xml(data, str(Path(file).with_suffix('.jpg')), label_map_dict)
+def write_sharded_tf_example(shards: list, label_map_dict: dict, file_format: str, num_workers: int = 1, progress=None,
+                             resize: list = None, memory_budget_mb: float = 1024, journal_keys: dict = None,
+                             compression: str = None, drop_invalid: bool = False):
+  # shards: [(save_path, files), ...]，所有分片共用同一條管線，結果依輸入順序寫入
+  # journal_keys: {save_path: key}，key 與上次中斷時的 journal 相同才會接續寫入
+  if progress is None:
+    progress = ConversionProgress('record', sum(len(files) for _, files in shards))
+  if journal_keys is None:
+    journal_keys = {}
+  journals = {}
+  for save_path, files in shards:
+    key = journal_keys.get(save_path) or journal_key([files, file_format, dict(label_map_dict), resize, compression, drop_invalid])
+    journals[save_path] = RecordJournal(key) if compression else RecordJournal.load(save_path, key)
 
-      elif file_format == 'json':
-        with open(file, 'r') as fid:
-          data = json.load(fid)
-        tf_example = dict_to_tf_example_with_json(data, str(Path(file).with_suffix('.jpg')), label_map_dict)
-      
-      writer.write(tf_example.SerializeToString())
+  resumed = sum(journal.done for journal in journals.values())
+  if resumed:
+    progress.resume(resumed, sum(len(journal.skipped) for journal in journals.values()))
+    yield f'resuming after {resumed} files committed in the journal'
+
+  all_files = [file for save_path, files in shards for file in files[journals[save_path].done:]]
+  pipeline = conversion_pipeline(label_map_dict, file_format, num_workers, resize, memory_budget_mb, drop_invalid)
+  encoded = pipeline.run(all_files)
+  for save_path, files in shards:
+    source_bytes, shard_bytes = 0, 0
+    writer = ResumableRecordWriter(save_path, journals[save_path], compression)
+    try:
+      for file in files[writer.journal.done:]:
+        serialized, error = next(encoded)
+        if error is not None:
+          # 單一檔案失敗時記入略過清單，不中止整個轉換
+          print(f'Skipping {file}: {error}')
+          progress.skip()
+          writer.skip(file, str(error))
+          yield progress.event()
+          continue
+        serialized, example_stats = serialized
+        writer.write(serialized, image_path_for(file), example_stats)
+        progress.update(len(serialized))
+        shard_bytes += len(serialized)
+        if resize:
+          source_bytes += os.path.getsize(image_path_for(file))
+        # 狀態只經由 yield 回報，由呼叫端決定輸出方式，避免記錄檔中每行出現兩次
+        yield progress.event()
+    except GeneratorExit:
+      # 轉換被中止時提交已完成的紀錄，下次由此處繼續
+      writer.commit()
+      raise
+    except Exception:
+      yield progress.event(finished=True)
+      raise
+    journal = writer.close()
+    write_index(save_path, journal.lengths, journal.filenames, journal.objects, concat_columns(journal.columns), compression)
+    remove_journal(save_path)
+    if journal.skipped:
+      yield f'{Path(save_path).name}: skipped {len(journal.skipped)} files, see {Path(skipped_path(save_path)).name}'
+
+    if resize and source_bytes:
+      yield (f'{Path(save_path).name}: {source_bytes / 1024 / 1024:.1f} MB -> {shard_bytes / 1024 / 1024:.1f} MB '
+             f'({100 * (1 - shard_bytes / source_bytes):.0f}% smaller)')
+
+  encoded.close()
+  if all_files:
+    yield pipeline.summary()
+
+def write_tf_example(save_path: str, all_files: list, label_map_dict: dict, file_format: str, num_workers: int = 1,
+                     resize: list = None, memory_budget_mb: float = 1024, compression: str = None, drop_invalid: bool = False):
+  yield from write_sharded_tf_example([(save_path, all_files)], label_map_dict, file_format, num_workers, resize=resize,
+                                      memory_budget_mb=memory_budget_mb, compression=compression, drop_invalid=drop_invalid)
+
+def shard_name(record_type: str, index: int, num_shards: int) -> str:
+  return f'{record_type}-{index:05d}-of-{num_shards:05d}.record'
+
+def shard_pattern(record_type: str) -> str:
+  return f'{record_type}-?????-of-?????.record'
+
+def bucket_shard_pattern(record_type: str) -> str:
+  # 依寬高比分組的分片組：<record_type>_<bucket>-?????-of-?????.record
+  return f'{record_type}_*-?????-of-?????.record'
+
+def record_input_path(save_dir: str, record_type: str) -> str:
+  # 訓練設定使用的 input_path，舊版單一檔案的 TFRecord 仍可讀取
+  save_dir = Path(save_dir)
+  if list(save_dir.glob(bucket_shard_pattern(record_type))):
+    return str(save_dir / bucket_shard_pattern(record_type))
+  if not list(save_dir.glob(shard_pattern(record_type))) and (save_dir / f'{record_type}.record').exists():
+    return str(save_dir / f'{record_type}.record')
+  return str(save_dir / shard_pattern(record_type))
+
+def record_settings(save_dir: str, record_type: str) -> dict:
+  return load_manifest(str(save_dir)).get(record_type, {}).get('settings', {})
+
+def record_compression(save_dir: str, record_type: str) -> str:
+  # 轉換時使用的壓縮格式記錄在 manifest，訓練時據此設定讀取端的 compression_type
+  return record_settings(save_dir, record_type).get('compression') or ''
+
+def records_preshuffled(save_dir: str, record_type: str) -> bool:
+  return record_settings(save_dir, record_type).get('shuffle_seed') is not None
+
+def record_buckets(save_dir: str, record_type: str) -> list:
+  # 磁碟上實際存在的分組名稱，例如 ['train_landscape', 'train_square']
+  return sorted({path.name.rsplit('-', 3)[0] for path in Path(save_dir).glob(bucket_shard_pattern(record_type))})
+
+def records_bucketed(save_dir: str, record_type: str) -> bool:
+  # 只有一組時訓練端退回一般讀取，不能關閉 pad_to_max_dimension
+  return bool(record_settings(save_dir, record_type).get('aspect_buckets')) and len(record_buckets(save_dir, record_type)) > 1
+
+def estimate_num_shards(all_files: list, shard_size_mb: float) -> int:
+  # 每個檔案只查詢一次影像路徑與 stat
+  stats = (file_stat(image_path_for(file)) for file in all_files)
+  total_bytes = sum(stat[0] for stat in stats if stat)
+  return max(1, math.ceil(total_bytes / (shard_size_mb * 1024 * 1024)))
+
+def remove_records(save_dir: Path, record_type: str, keep: list = ()) -> None:
+  keep = {Path(path).name for path in keep}
+  for old_record in [*save_dir.glob(shard_pattern(record_type)), *save_dir.glob(bucket_shard_pattern(record_type)),
+                     save_dir / f'{record_type}.record']:
+    if old_record.exists() and old_record.name not in keep:
+      old_record.unlink()
+      Path(index_path(old_record)).unlink(missing_ok=True)
+      Path(skipped_path(old_record)).unlink(missing_ok=True)
+      remove_journal(old_record)
 
 def gen_label_map(label_map_dict: dict, save_path: str) -> None:
   label_map = string_int_label_map_pb2.StringIntLabelMap()
@@ -160,21 +395,105 @@ def gen_label_map(label_map_dict: dict, save_path: str) -> None:
   with tf.io.gfile.GFile(save_path, 'w') as fid:
     fid.write(str(label_map))
 
-def generate_record(target_dir: str, data_folders: list, save_dir: str, label_map_dict={}, format='json', is_train=True):
+def generate_record(target_dir: str, data_folders: list, save_dir: str, label_map_dict=None, format='json', is_train=True, num_workers=None,
+                    num_shards=None, shard_size_mb=200, training_classes=None, resize=None, memory_budget_mb=1024,
+                    compression=None, shuffle_seed=0, aspect_buckets=False, drop_invalid_boxes=False, exclude_files=None):
+  # exclude_files 為 prepare_label_map 回報無法讀取的標註檔，不列入分片
   save_dir = Path(save_dir)
   target_dir = Path(target_dir)
   create_folder(save_dir)
   
   record_type = 'train' if is_train else 'test'
-  save_record = save_dir / f'{record_type}.record'
   if is_train:
       save_label_map = save_dir / 'label_map.pbtxt'
   
+  if num_workers is None:
+    num_workers = os.cpu_count() or 1
+
   files = get_all_files(str(target_dir), data_folders, format)
-  write_tf_example(str(save_record), files, label_map_dict, format)
+  unreadable, excluded = set(exclude_files or ()), 0
+  if label_map_dict is None:
+    labels, scanned_unreadable = scan_labels(files, format, num_workers)
+    label_map_dict = build_label_map(labels, training_classes)
+    unreadable.update(scanned_unreadable)
+  if unreadable:
+    excluded = len(files)
+    files = [file for file in files if file not in unreadable]
+    excluded -= len(files)
+    if excluded:
+      yield f'{record_type}: left out {excluded} unreadable annotation files'
+  groups = {record_type: files}
+  if aspect_buckets and files:
+    # 依寬高比分組，各組寫入獨立的分片組，訓練時每個批次只取自同一組
+    sizes = image_sizes([image_path_for(file) for file in files])
+    buckets = bucket_names(sizes)
+    groups = {f'{record_type}_{name}': [file for file, bucket in zip(files, buckets) if bucket == name]
+              for name, _, _ in ASPECT_BUCKETS if name in buckets}
+    yield f'{record_type}: {format_padding(sizes, buckets)}'
+
+  # 指定 num_shards 時依檔案數比例分配給各組，否則各組依大小估算
+  shard_counts = {
+    prefix: max(1, round(num_shards * len(group) / len(files))) if num_shards and files
+    else num_shards or estimate_num_shards(group, shard_size_mb)
+    for prefix, group in groups.items()}
+  shard_files, shard_paths = [], []
+  for prefix, group in groups.items():
+    shard_files += assign_shards(group, str(target_dir), shard_counts[prefix], shuffle_seed)
+    shard_paths += [str(save_dir / shard_name(prefix, index, shard_counts[prefix])) for index in range(shard_counts[prefix])]
+  num_shards = len(shard_paths)
+
+  manifest = load_manifest(str(save_dir))
+  # resize: [max_side, jpeg_quality]，設定改變時所有分片都需重建
+  resize = list(resize) if resize else None
+  # compression: None、'GZIP' 或 'ZLIB'
+  compression = compression or None
+  settings = {'format': format, 'num_shards': num_shards, 'label_map': dict(label_map_dict), 'resize': resize,
+              'compression': compression, 'shuffle_seed': shuffle_seed,
+              'aspect_buckets': shard_counts if aspect_buckets else None, 'drop_invalid_boxes': bool(drop_invalid_boxes)}
+  if format == 'coco':
+    # 逐張影像無法分別追蹤 COCO 標註檔的修改，標註檔變動時整份重建
+    settings['annotation_files'] = {path: file_stat(path) for path in sorted({split_source(file)[0] for file in files})}
+  entries, dirty = plan_shards(
+    [(path, [(relative_source(file, str(target_dir)), file, image_path_for(file)) for file in files])
+     for path, files in zip(shard_paths, shard_files)],
+    manifest.get(record_type, {}), settings)
+
+  remove_records(save_dir, record_type, keep=shard_paths)
+  # 先將待重建分片自 manifest 移除，轉換中斷時下次仍會重建
+  manifest[record_type] = {
+    'settings': settings,
+    'files': {relative: entry for relative, entry in entries.items() if entry['shard'] not in dirty},
+  }
+  save_manifest(str(save_dir), manifest)
+
+  rebuilt = sum(len(shard_files[index]) for index in dirty)
+  yield (f'{record_type}: reused {len(files) - rebuilt} files in {num_shards - len(dirty)} shards, '
+         f'rebuilding {rebuilt} files in {len(dirty)} shards')
+  progress = ConversionProgress(record_type, rebuilt, reused=len(files) - rebuilt, skipped=excluded)
+  # 分片的檔案紀錄與設定都未改變時，才接續上次中斷的 journal
+  journal_keys = {
+    shard_paths[index]: journal_key({
+      'settings': settings,
+      'files': [[relative_source(file, str(target_dir)), entries[relative_source(file, str(target_dir))]] for file in shard_files[index]],
+    })
+    for index in dirty}
+  yield from write_sharded_tf_example(
+    [(shard_paths[index], shard_files[index]) for index in dirty], label_map_dict, format, num_workers, progress, resize,
+    memory_budget_mb, journal_keys, compression, bool(drop_invalid_boxes))
+
+  manifest[record_type]['files'] = entries
+  save_manifest(str(save_dir), manifest)
+
+  # 由索引檔即可取得筆數與統計資料，不需重新讀取 TFRecord
+  dataset_index = DatasetIndex(shard_paths)
+  save_statistics(str(save_dir), record_type, compute_statistics(dataset_index, label_map_dict))
+  yield f'{record_type}: {len(dataset_index)} records indexed'
+  event = progress.event(finished=True)
+  record_run(str(save_dir), event, format=format, num_workers=num_workers, num_shards=num_shards, resize=resize,
+             memory_budget_mb=memory_budget_mb, compression=compression)
+  yield event
   
   if is_train:
       gen_label_map(label_map_dict, str(save_label_map))
   
-  print(f'Finish generating {record_type} set tfrecord')
   yield f'Finish generating {record_type} set tfrecord'
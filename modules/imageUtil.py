@@ -0,0 +1,28 @@
+import io
+import PIL.Image
+
+
+def resize_jpeg(image: PIL.Image.Image, encoded_img: bytes, max_side: int, quality: int) -> tuple:
+  # 回傳 (encoded, width, height)，長邊不超過 max_side 的影像保留原始位元組
+  width, height = image.size
+  if max(width, height) <= max_side:
+    return encoded_img, width, height
+
+  scale = max_side / max(width, height)
+  size = (max(1, round(width * scale)), max(1, round(height * scale)))
+  # JPEG 可在解碼時以 DCT 直接縮小，大幅降低解碼成本
+  image.draft('RGB', size)
+  resized = image.convert('RGB').resize(size, PIL.Image.LANCZOS)
+
+  output = io.BytesIO()
+  resized.save(output, format='JPEG', quality=quality)
+  return output.getvalue(), size[0], size[1]
+
+def resizer_max_side(image_resizer) -> int:
+  # 由模型設定的 image_resizer 推算輸入影像的最大邊長，無法推算時回傳 None
+  resizer_type = image_resizer.WhichOneof('image_resizer_oneof')
+  if resizer_type == 'keep_aspect_ratio_resizer':
+    return image_resizer.keep_aspect_ratio_resizer.max_dimension
+  if resizer_type == 'fixed_shape_resizer':
+    return max(image_resizer.fixed_shape_resizer.height, image_resizer.fixed_shape_resizer.width)
+  return None
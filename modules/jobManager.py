@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import secrets
+import threading
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import psutil
+from modules.logPump import LogBuffer, LOG_FLUSH_INTERVAL
+if os.name == 'nt':
+  import msvcrt
+else:
+  import fcntl
+
+
+# 每個工作一個資料夾：projects/<name>/jobs/<job_id>/{job.json, output.log, exit_code}
+# 狀態：queued（排隊中）→ pending（啟動中）→ running / paused → finished / failed / cancelled，lost 為執行器已消失
+JOBS_DIR = 'jobs'
+JOB_FILE = 'job.json'
+LOG_FILE = 'output.log'
+EXIT_FILE = 'exit_code'
+LOCK_FILE = 'job.lock'
+# 重新連線時只讀取記錄檔最後的部分
+TAIL_BYTES = 64 * 1024
+
+def jobs_dir(project_name: str) -> Path:
+  return Path('projects') / project_name / JOBS_DIR
+
+def job_dir(project_name: str, job_id: str) -> Path:
+  return jobs_dir(project_name) / job_id
+
+def load_job(directory) -> dict:
+  with open(Path(directory) / JOB_FILE, 'r', encoding='utf8') as fid:
+    return json.load(fid)
+
+def save_job(directory, job: dict) -> None:
+  # 每個寫入者使用自己的暫存檔，以 os.replace 原子地取代，讀取端不會讀到寫到一半的檔案
+  path = Path(directory) / JOB_FILE
+  tmp_path = path.with_name(f'{JOB_FILE}.{os.getpid()}.{threading.get_ident()}.tmp')
+  with open(tmp_path, 'w', encoding='utf8') as fid:
+    json.dump(job, fid, ensure_ascii=False, indent=2)
+  os.replace(tmp_path, path)
+
+@contextmanager
+def job_lock(directory):
+  # job.json 由排程器、jobRunner、tfWorker 與網頁介面各自改寫，讀取到寫回之間以檔案鎖互斥，避免互相覆蓋欄位
+  with open(Path(directory) / LOCK_FILE, 'a+') as fid:
+    if os.name == 'nt':
+      fid.seek(0)
+      while True:
+        try:
+          msvcrt.locking(fid.fileno(), msvcrt.LK_LOCK, 1)
+          break
+        except OSError:
+          continue
+    else:
+      fcntl.flock(fid, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      if os.name == 'nt':
+        fid.seek(0)
+        msvcrt.locking(fid.fileno(), msvcrt.LK_UNLCK, 1)
+      else:
+        fcntl.flock(fid, fcntl.LOCK_UN)
+
+def update_job(directory, **fields) -> dict:
+  with job_lock(directory):
+    job = load_job(directory)
+    job.update(fields)
+    save_job(directory, job)
+  return job
+
+def pid_alive(pid: int) -> bool:
+  try:
+    return pid is not None and psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+  except psutil.Error:
+    return False
+
+def job_status(directory) -> str:
+  # 以 exit_code 檔判斷是否結束，伺服器重啟後仍可得知結果；執行器已不存在卻沒有結束紀錄時為 lost
+  directory = Path(directory)
+  exit_path = directory / EXIT_FILE
+  job = load_job(directory)
+  if exit_path.exists():
+    if job.get('cancelled'):
+      return 'cancelled'
+    return 'finished' if exit_path.read_text().strip() == '0' else 'failed'
+  if job.get('status') == 'queued':
+    return 'queued'
+  if job.get('status') == 'pending' and job.get('runner_pid') is None:
+    return 'pending'
+  if not pid_alive(job.get('runner_pid')):
+    return 'lost'
+  if job.get('status') == 'pending':
+    return 'pending'
+  return 'paused' if job.get('paused') else 'running'
+
+def create_job(project_name: str, kind: str, command: list, metrics_path: str = None, cores: int = None,
+               nice: int = None, env: dict = None) -> Path:
+  # 建立排隊中的工作；cores 為要求的核心數，None 為整台機器，由 jobScheduler 決定何時啟動
+  # nice 為降低的執行優先權，env 為額外的環境變數
+  job_id = f'{datetime.now():%Y%m%d-%H%M%S}-{kind}-{secrets.token_hex(2)}'
+  directory = job_dir(project_name, job_id)
+  directory.mkdir(parents=True, exist_ok=True)
+  save_job(directory, {
+    'id': job_id, 'project': project_name, 'kind': kind, 'command': [str(arg) for arg in command],
+    'cwd': os.getcwd(), 'metrics': str(metrics_path) if metrics_path else None,
+    'cores': int(cores) if cores else None, 'cpus': None, 'nice': nice, 'env': env or {},
+    'status': 'queued', 'created': datetime.now().isoformat(timespec='seconds'),
+  })
+  (directory / LOG_FILE).touch()
+  return directory
+
+def start_job(directory, cpus: list = None) -> None:
+  # 以獨立的 session 啟動 jobRunner，關閉瀏覽器或 Gradio 請求逾時都不會中止工作；cpus 為分配到的核心
+  with job_lock(directory):
+    job = load_job(directory)
+    if job.get('cancelled'):
+      return
+    job.update(status='pending', cpus=cpus)
+    save_job(directory, job)
+  options = {'start_new_session': True}
+  if os.name == 'nt':
+    options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+  runner = subprocess.Popen([sys.executable, '-m', 'modules.jobRunner', str(directory)],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **options)
+  update_job(directory, runner_pid=runner.pid)
+
+def thread_env(cores: int) -> dict:
+  # 讓 TF 與 OpenMP 的執行緒數量符合分配到的核心數
+  # 經由 tfWorker fork 的工作 OpenMP 已在 fork server 載入時初始化，OMP_NUM_THREADS 不會生效，只有 CPU affinity 與 TF 執行緒設定有效
+  return {
+    'OMP_NUM_THREADS': str(cores),
+    'TF_NUM_INTRAOP_THREADS': str(cores),
+    'TF_NUM_INTEROP_THREADS': str(2 if cores >= 4 else 1),
+  }
+
+def job_processes(job: dict) -> list:
+  # 工作指令的進程與其所有子進程（例如轉換的 ProcessPool），以及由 tfWorker fork 出的進程
+  processes = []
+  for key in ('pid', 'worker_pid'):
+    try:
+      process = psutil.Process(job[key])
+      processes += [process] + process.children(recursive=True)
+    except (psutil.Error, KeyError, TypeError, ValueError):
+      pass
+  return processes
+
+def cancel_job(directory) -> None:
+  # 排隊中的工作直接標記結束；執行中的工作終止整個進程樹，jobRunner 會寫入 exit_code
+  directory = Path(directory)
+  status = job_status(directory)
+  if status == 'queued':
+    update_job(directory, cancelled=True, status='cancelled')
+    (directory / EXIT_FILE).write_text('-1')
+    return
+  if status not in ('pending', 'running', 'paused'):
+    return
+  # 此時還沒有 pid 的工作由 jobRunner 在啟動指令前後檢查 cancelled 後自行終止
+  job = update_job(directory, cancelled=True, paused=False)
+  terminate_processes(job_processes(job))
+
+def terminate_processes(processes: list, timeout: float = 10) -> None:
+  for process in processes:
+    try:
+      # 暫停中的進程要先恢復才會處理 SIGTERM
+      process.resume()
+      process.terminate()
+    except psutil.Error:
+      pass
+  _, alive = psutil.wait_procs(processes, timeout=timeout)
+  for process in alive:
+    try:
+      process.kill()
+    except psutil.Error:
+      pass
+
+def pause_job(directory) -> None:
+  directory = Path(directory)
+  if job_status(directory) != 'running':
+    return
+  job = update_job(directory, paused=True)
+  for process in job_processes(job):
+    try:
+      process.suspend()
+    except psutil.Error:
+      pass
+
+def resume_job(directory) -> None:
+  directory = Path(directory)
+  if job_status(directory) != 'paused':
+    return
+  job = update_job(directory, paused=False)
+  for process in job_processes(job):
+    try:
+      process.resume()
+    except psutil.Error:
+      pass
+
+def all_job_dirs() -> list:
+  # 所有專案的工作，依建立時間排序（工作 ID 以時間開頭）
+  return sorted((path.parent for path in Path('projects').glob(f'*/{JOBS_DIR}/*/{JOB_FILE}')), key=lambda path: path.name)
+
+def list_jobs(project_name: str) -> list:
+  # 由新到舊
+  jobs = []
+  if not project_name or not jobs_dir(project_name).exists():
+    return jobs
+  for directory in sorted(jobs_dir(project_name).iterdir(), reverse=True):
+    if (directory / JOB_FILE).exists():
+      jobs.append({**load_job(directory), 'status': job_status(directory)})
+  return jobs
+
+def read_log(directory, offset: int) -> tuple:
+  # 自 offset 讀取到檔尾，只回傳完整的行；回傳 (lines, 新的 offset)
+  with open(Path(directory) / LOG_FILE, 'rb') as fid:
+    fid.seek(offset)
+    data = fid.read()
+  end = data.rfind(b'\n') + 1
+  return data[:end].decode('utf8', errors='replace').splitlines(), offset + end
+
+def follow_job(directory, offset: int = None, interval: float = LOG_FLUSH_INTERVAL):
+  # 自 offset 開始追蹤記錄檔並依固定間隔輸出最後的行；offset 為 None 時只讀最後 TAIL_BYTES
+  # 產生 (text, status, offset)，工作結束後輸出最後一次
+  directory = Path(directory)
+  if offset is None:
+    size = (directory / LOG_FILE).stat().st_size
+    offset = max(0, size - TAIL_BYTES)
+    if offset:
+      # 從下一個完整的行開始
+      with open(directory / LOG_FILE, 'rb') as fid:
+        fid.seek(offset)
+        offset += len(fid.readline())
+  buffer = LogBuffer()
+  while True:
+    status = job_status(directory)
+    lines, new_offset = read_log(directory, offset)
+    buffer.extend(lines)
+    if status not in ('queued', 'pending', 'running', 'paused'):
+      yield buffer.text(), status, new_offset
+      return
+    if new_offset != offset or not buffer.total:
+      yield buffer.text(), status, new_offset
+    offset = new_offset
+    time.sleep(interval)
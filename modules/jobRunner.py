@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import subprocess
+from datetime import datetime
+from pathlib import Path
+import psutil
+from modules.jobManager import (EXIT_FILE, LOG_FILE, job_lock, job_processes, load_job, save_job, terminate_processes,
+                               thread_env, update_job)
+from modules.logPump import pump_process
+from modules.trainMetrics import TrainingMetrics
+
+
+# 由 jobManager.start_job 以獨立進程啟動：python -m modules.jobRunner <job_dir>
+# 執行工作指令，stdout 與 stderr 同時寫入 output.log，結束時寫入 exit_code
+def run(directory: str) -> int:
+  directory = Path(directory)
+  job = load_job(directory)
+  metrics = TrainingMetrics(job['metrics'], run=job['id']) if job.get('metrics') else None
+  update_job(directory, status='running', runner_pid=os.getpid(), started=datetime.now().isoformat(timespec='seconds'))
+
+  # 限制在分配到的核心上執行，子進程會繼承 CPU affinity
+  env = {**os.environ, 'PYTHONUNBUFFERED': '1', 'OD_JOB_DIR': str(directory)}
+  if job.get('cpus'):
+    env.update(thread_env(len(job['cpus'])))
+    if hasattr(psutil.Process, 'cpu_affinity'):
+      psutil.Process().cpu_affinity(job['cpus'])
+  # 工作指定的環境變數（例如調校後的 OMP_NUM_THREADS）優先
+  env.update(job.get('env', {}))
+  # 降低優先權，子進程會繼承
+  if job.get('nice'):
+    psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if os.name == 'nt' else job['nice'])
+
+  lock = threading.Lock()
+  with open(directory / LOG_FILE, 'a', encoding='utf8') as log:
+    def on_line(line):
+      with lock:
+        log.write(line + '\n')
+        log.flush()
+      if metrics is not None:
+        metrics.feed(line)
+
+    # 啟動中（還沒有 pid）被取消的工作不執行指令
+    if load_job(directory).get('cancelled'):
+      on_line('工作已取消')
+      returncode = -1
+    else:
+      try:
+        process = subprocess.Popen(job['command'], cwd=job['cwd'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True, env=env)
+      except OSError as e:
+        on_line(f'無法啟動工作: {e}')
+        returncode = -1
+      else:
+        # 記錄 pid 之前送出的取消找不到進程，記錄後再檢查一次
+        if update_job(directory, pid=process.pid).get('cancelled'):
+          terminate_processes(job_processes({'pid': process.pid}))
+        pump_process(process, on_line=on_line).join()
+        returncode = process.wait()
+
+  if metrics is not None:
+    metrics.commit()
+  (directory / EXIT_FILE).write_text(str(returncode))
+  with job_lock(directory):
+    job = load_job(directory)
+    job.update(status='cancelled' if job.get('cancelled') else 'finished' if returncode == 0 else 'failed',
+               returncode=returncode, finished=datetime.now().isoformat(timespec='seconds'))
+    save_job(directory, job)
+  return returncode
+
+if __name__ == '__main__':
+  sys.exit(run(sys.argv[1]))
@@ -0,0 +1,72 @@
+import os
+import threading
+import psutil
+from modules.jobManager import all_job_dirs, create_job, job_status, load_job, start_job
+
+
+# 排程器檢查佇列的間隔（秒）
+SCHEDULE_INTERVAL = 1.0
+# 佔用核心的狀態，暫停中的工作仍保留核心與記憶體
+ACTIVE_STATUSES = ('pending', 'running', 'paused')
+
+def available_cpus() -> list:
+  # 伺服器本身可使用的核心，例如已被 taskset 限制時只分配其中的核心
+  if hasattr(psutil.Process, 'cpu_affinity'):
+    return sorted(psutil.Process().cpu_affinity())
+  return list(range(os.cpu_count() or 1))
+
+class JobScheduler:
+  # 佇列即為 projects/*/jobs/ 下狀態為 queued 的 job.json，伺服器重啟後排隊中的工作不會遺失
+  # 依建立順序先進先出，最前面的工作核心不足時後面的工作也等待，避免大工作一直排不到
+  def __init__(self, cpus: list = None, interval: float = SCHEDULE_INTERVAL):
+    self.cpus = cpus or available_cpus()
+    self.interval = interval
+    self.lock = threading.Lock()
+    self.wake = threading.Event()
+    self.thread = None
+
+  def start(self) -> None:
+    with self.lock:
+      if self.thread is None:
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+  def submit(self, project_name: str, kind: str, command: list, metrics_path: str = None, cores: int = None,
+             nice: int = None, env: dict = None) -> str:
+    directory = create_job(project_name, kind, command, metrics_path, cores, nice, env)
+    self.start()
+    self.schedule()
+    return directory.name
+
+  def schedule(self) -> None:
+    with self.lock:
+      queued, busy = [], set()
+      for directory in all_job_dirs():
+        status = job_status(directory)
+        if status == 'queued':
+          queued.append(directory)
+        elif status in ACTIVE_STATUSES:
+          busy.update(load_job(directory).get('cpus') or [])
+      free = [cpu for cpu in self.cpus if cpu not in busy]
+      for directory in queued:
+        cores = min(load_job(directory).get('cores') or len(self.cpus), len(self.cpus))
+        if cores > len(free):
+          break
+        cpus, free = free[:cores], free[cores:]
+        start_job(directory, cpus)
+
+  def loop(self) -> None:
+    while True:
+      try:
+        self.schedule()
+      except (OSError, ValueError):
+        # job.json 正在被其他進程改寫時略過這一輪
+        pass
+      self.wake.wait(self.interval)
+      self.wake.clear()
+
+scheduler = JobScheduler()
+
+def submit_job(project_name: str, kind: str, command: list, metrics_path: str = None, cores: int = None,
+               nice: int = None, env: dict = None) -> str:
+  return scheduler.submit(project_name, kind, command, metrics_path, cores, nice, env)
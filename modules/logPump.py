@@ -0,0 +1,55 @@
+import threading
+from collections import deque
+
+
+# 輸出更新到 Gradio 的間隔（秒）與畫面保留的行數
+LOG_FLUSH_INTERVAL = 0.5
+LOG_BUFFER_LINES = 500
+
+class LogBuffer:
+  # 固定長度的環狀緩衝區，較舊的行被丟棄，記憶體用量固定
+  def __init__(self, max_lines: int = LOG_BUFFER_LINES):
+    self.lines = deque(maxlen=max_lines)
+    self.total = 0
+    self.lock = threading.Lock()
+
+  def append(self, line: str) -> None:
+    with self.lock:
+      self.lines.append(line)
+      self.total += 1
+
+  def extend(self, lines: list) -> None:
+    with self.lock:
+      self.lines.extend(lines)
+      self.total += len(lines)
+
+  def text(self) -> str:
+    with self.lock:
+      dropped = self.total - len(self.lines)
+      lines = list(self.lines)
+    header = [f'...（省略較早的 {dropped} 行）'] if dropped else []
+    return '\n'.join(header + lines) + '\n' if lines else ''
+
+class LogPump:
+  # 每個管線各由一個執行緒持續讀取，子進程不會因某一個管線的緩衝區寫滿而卡住
+  def __init__(self, streams: list, on_line):
+    # streams: [(前綴, 文字模式的檔案物件), ...]；on_line(line) 在讀取執行緒中呼叫，例如寫入記錄檔或解析訓練數據
+    self.on_line = on_line
+    self.threads = [threading.Thread(target=self.read, args=(prefix, stream), daemon=True)
+                    for prefix, stream in streams if stream is not None]
+    for thread in self.threads:
+      thread.start()
+
+  def read(self, prefix: str, stream) -> None:
+    for line in iter(stream.readline, ''):
+      line = line.rstrip('\n')
+      if line.strip():
+        self.on_line(prefix + line)
+    stream.close()
+
+  def join(self) -> None:
+    for thread in self.threads:
+      thread.join()
+
+def pump_process(process, on_line, stdout_prefix: str = '', stderr_prefix: str = '') -> LogPump:
+  return LogPump([(stdout_prefix, process.stdout), (stderr_prefix, process.stderr)], on_line)
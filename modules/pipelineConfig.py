@@ -0,0 +1,72 @@
+import os
+import json
+import threading
+from pathlib import Path
+from google.protobuf import text_format
+from object_detection.protos import pipeline_pb2
+from object_detection.utils import config_util, label_map_util
+
+
+# 依 (路徑, mtime) 快取解析後的 pipeline.config 與 label map，檔案未變時不重新解析
+_cache = {}
+_lock = threading.Lock()
+
+def cached(kind: str, path: str, load):
+  path = str(path)
+  mtime = os.stat(path).st_mtime_ns
+  with _lock:
+    entry = _cache.get((kind, path))
+    if entry and entry[0] == mtime:
+      return entry[1]
+  value = load(path)
+  with _lock:
+    _cache[(kind, path)] = (mtime, value)
+  return value
+
+def pipeline_proto(path: str) -> pipeline_pb2.TrainEvalPipelineConfig:
+  # 回傳複本，呼叫端可以自由修改
+  config = pipeline_pb2.TrainEvalPipelineConfig()
+  config.CopyFrom(cached('pipeline', path, parse_pipeline))
+  return config
+
+def parse_pipeline(path: str) -> pipeline_pb2.TrainEvalPipelineConfig:
+  config = pipeline_pb2.TrainEvalPipelineConfig()
+  with open(path, 'r', encoding='utf8') as fid:
+    text_format.Merge(fid.read(), config)
+  return config
+
+def pipeline_configs(path: str) -> dict:
+  # 與 config_util.get_configs_from_pipeline_file 相同的 dict 格式
+  return config_util.create_configs_from_pipeline_proto(pipeline_proto(path))
+
+def model_type(path: str) -> str:
+  return cached('pipeline', path, parse_pipeline).model.WhichOneof('model')
+
+def model_config(path: str):
+  return getattr(cached('pipeline', path, parse_pipeline).model, model_type(path))
+
+def label_map_dict(path: str) -> dict:
+  return dict(cached('label_map', path, label_map_util.get_label_map_dict))
+
+def merged_pipeline(path: str, override_dict: dict) -> pipeline_pb2.TrainEvalPipelineConfig:
+  # 合併後的設定以參考設定的 mtime 與覆寫內容為鍵快取，相同設定重複啟動或掃描參數時不再重建
+  key = json.dumps(override_dict, sort_keys=True, default=str)
+  entry = cached('merged', path, lambda _: {})
+  if key not in entry:
+    configs = config_util.merge_external_params_with_configs(pipeline_configs(path), kwargs_dict=override_dict)
+    entry[key] = config_util.create_pipeline_proto_from_configs(configs)
+  config = pipeline_pb2.TrainEvalPipelineConfig()
+  config.CopyFrom(entry[key])
+  return config
+
+def pipeline_text(config: pipeline_pb2.TrainEvalPipelineConfig) -> str:
+  return text_format.MessageToString(config)
+
+def save_pipeline(config: pipeline_pb2.TrainEvalPipelineConfig, directory: str) -> bool:
+  # 內容與現有的 pipeline.config 相同時不重寫，保留 mtime；回傳是否寫入
+  path = Path(directory) / 'pipeline.config'
+  text = pipeline_text(config)
+  if path.exists() and path.read_text(encoding='utf8') == text:
+    return False
+  config_util.save_pipeline_config(config, str(directory))
+  return True
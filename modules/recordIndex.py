@@ -0,0 +1,87 @@
+import bisect
+from pathlib import Path
+import numpy as np
+
+
+INDEX_SUFFIX = '.index'
+# TFRecord 每筆紀錄的框架：uint64 長度 + uint32 長度 CRC + 資料 + uint32 資料 CRC
+RECORD_HEADER_BYTES = 12
+RECORD_OVERHEAD_BYTES = 16
+INDEX_FIELDS = ('offset', 'length', 'objects', 'filename', 'compression')
+
+def index_path(record_path: str) -> str:
+  return str(record_path) + INDEX_SUFFIX
+
+def write_index(record_path: str, lengths: list, filenames: list, object_counts: list, columns: dict = None,
+                compression: str = None) -> None:
+  # columns 為額外的欄位陣列（例如影像尺寸、各物件類別），供統計資料使用
+  # 壓縮的 TFRecord 無法依位移讀取，offset 僅在未壓縮時有效
+  lengths = np.asarray(lengths, dtype=np.uint64)
+  offsets = np.zeros(len(lengths), dtype=np.uint64)
+  if len(lengths):
+    offsets[1:] = np.cumsum(lengths + RECORD_OVERHEAD_BYTES)[:-1]
+  with open(index_path(record_path), 'wb') as fid:
+    np.savez(fid, offset=offsets, length=lengths,
+             objects=np.asarray(object_counts, dtype=np.uint32),
+             filename=np.asarray(filenames, dtype=np.str_),
+             compression=np.asarray(compression or ''),
+             **(columns or {}))
+
+class RecordIndex:
+  # 單一 TFRecord 檔的索引，可 O(1) 取得紀錄數量與讀取第 n 筆紀錄
+  def __init__(self, record_path: str):
+    self.record_path = str(record_path)
+    with np.load(index_path(record_path)) as index:
+      self.offset = index['offset']
+      self.length = index['length']
+      self.objects = index['objects']
+      self.filename = index['filename']
+      self.compression = str(index['compression']) if 'compression' in index.files else ''
+      self.columns = {name: index[name] for name in index.files if name not in INDEX_FIELDS}
+
+  def __len__(self) -> int:
+    return len(self.length)
+
+  def read(self, n: int) -> bytes:
+    if self.compression:
+      raise ValueError(f'Random access is not supported for {self.compression} compressed records: {self.record_path}')
+    with open(self.record_path, 'rb') as fid:
+      fid.seek(int(self.offset[n]) + RECORD_HEADER_BYTES)
+      return fid.read(int(self.length[n]))
+
+class DatasetIndex:
+  # 合併同一類型所有分片的索引，以全域編號存取紀錄
+  def __init__(self, record_paths: list):
+    self.shards = [RecordIndex(path) for path in sorted(record_paths) if Path(index_path(path)).exists()]
+    self.starts = np.cumsum([0] + [len(shard) for shard in self.shards]).tolist()
+
+  @classmethod
+  def from_pattern(cls, record_pattern: str):
+    pattern = Path(record_pattern)
+    return cls([str(path) for path in pattern.parent.glob(pattern.name)])
+
+  def __len__(self) -> int:
+    return self.starts[-1]
+
+  def locate(self, n: int) -> tuple:
+    if not 0 <= n < len(self):
+      raise IndexError(f'Record {n} out of range ({len(self)} records)')
+    shard = bisect.bisect_right(self.starts, n) - 1
+    return self.shards[shard], n - self.starts[shard]
+
+  def read(self, n: int) -> bytes:
+    shard, local = self.locate(n)
+    return shard.read(local)
+
+  def filename(self, n: int) -> str:
+    shard, local = self.locate(n)
+    return str(shard.filename[local])
+
+  def objects(self, n: int) -> int:
+    shard, local = self.locate(n)
+    return int(shard.objects[local])
+
+  def sample(self, num_samples: int, seed: int = None) -> list:
+    # 隨機抽樣的紀錄編號，用於預覽或評估子集
+    rng = np.random.default_rng(seed)
+    return sorted(rng.choice(len(self), size=min(num_samples, len(self)), replace=False).tolist())
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+import numpy as np
+from modules.datasetStats import concat_columns
+
+
+JOURNAL_SUFFIX = '.journal'
+SEGMENT_SUFFIX = '.segment'
+SKIPPED_SUFFIX = '.skipped.json'
+# 每寫入 JOURNAL_EVERY_FILES 筆或經過 JOURNAL_EVERY_SECONDS 秒提交一次
+JOURNAL_EVERY_FILES = 100
+JOURNAL_EVERY_SECONDS = 30
+
+def journal_path(record_path: str) -> str:
+  return str(record_path) + JOURNAL_SUFFIX
+
+def segment_path(record_path: str) -> str:
+  return str(record_path) + SEGMENT_SUFFIX
+
+def skipped_path(record_path: str) -> str:
+  return str(record_path) + SKIPPED_SUFFIX
+
+def journal_key(value) -> str:
+  # 分片的檔案清單與轉換設定的雜湊，不一致時舊的 journal 作廢
+  return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf8')).hexdigest()
+
+def record_writer(path: str, compression: str = None):
+  # journal 的讀寫與分片截斷不需要 TensorFlow，只有寫入紀錄時才匯入
+  import tensorflow as tf
+  return tf.io.TFRecordWriter(path, tf.io.TFRecordOptions(compression_type=compression) if compression else None)
+
+def remove_journal(record_path: str) -> None:
+  for path in (journal_path(record_path), segment_path(record_path)):
+    Path(path).unlink(missing_ok=True)
+
+class RecordJournal:
+  # 分片已提交的進度：處理過的來源筆數、輸出檔位移，以及寫索引檔所需的各筆資料
+  def __init__(self, key: str):
+    self.key = key
+    self.done = 0
+    self.offset = 0
+    self.lengths = []
+    self.filenames = []
+    self.objects = []
+    self.columns = []
+    self.skipped = []
+
+  @classmethod
+  def load(cls, record_path: str, key: str):
+    journal = cls(key)
+    path = journal_path(record_path)
+    if not os.path.exists(path) or not os.path.exists(record_path):
+      return journal
+    try:
+      with np.load(path) as saved:
+        if str(saved['key']) != key or os.path.getsize(record_path) < int(saved['offset']):
+          return journal
+        journal.done = int(saved['done'])
+        journal.offset = int(saved['offset'])
+        journal.lengths = saved['lengths'].tolist()
+        journal.filenames = saved['filenames'].tolist()
+        journal.objects = saved['objects'].tolist()
+        columns = {name[len('column/'):]: saved[name] for name in saved.files if name.startswith('column/')}
+        journal.columns = [columns] if columns else []
+        journal.skipped = json.loads(str(saved['skipped']))
+    except (OSError, ValueError, KeyError) as e:
+      print(f'Ignoring unreadable journal {path}: {e}')
+      return cls(key)
+    return journal
+
+  def save(self, record_path: str) -> None:
+    path = journal_path(record_path)
+    tmp_path = path + '.tmp'
+    columns = concat_columns(self.columns)
+    with open(tmp_path, 'wb') as fid:
+      np.savez(fid, key=self.key, done=self.done, offset=self.offset,
+               lengths=np.asarray(self.lengths, dtype=np.uint64),
+               filenames=np.asarray(self.filenames, dtype=np.str_),
+               objects=np.asarray(self.objects, dtype=np.uint32),
+               skipped=json.dumps(self.skipped, ensure_ascii=False),
+               **{f'column/{name}': values for name, values in columns.items()})
+      fid.flush()
+      os.fsync(fid.fileno())
+    os.replace(tmp_path, path)
+
+class ResumableRecordWriter:
+  # 新紀錄先寫入 segment 檔，提交時附加到分片尾端、fsync 後再更新 journal
+  # 中斷後重新執行時，分片截斷到最後一次提交的位移，並從 journal.done 之後的來源繼續
+  # 壓縮的分片無法以附加 segment 的方式接續，直接寫入分片，中斷後整個分片重建
+  def __init__(self, record_path: str, journal: RecordJournal, compression: str = None):
+    self.record_path = str(record_path)
+    self.journal = journal
+    self.compression = compression
+    self.pending = 0
+    self.last_commit = time.monotonic()
+    if compression:
+      self.writer = record_writer(self.record_path, compression)
+      return
+    with open(self.record_path, 'ab'):
+      pass
+    os.truncate(self.record_path, self.journal.offset)
+    self.writer = record_writer(segment_path(self.record_path))
+
+  def write(self, serialized: bytes, filename: str, columns: dict) -> None:
+    self.writer.write(serialized)
+    self.journal.lengths.append(len(serialized))
+    self.journal.filenames.append(filename)
+    self.journal.objects.append(len(columns['class']))
+    self.journal.columns.append(columns)
+    self.advance()
+
+  def skip(self, file: str, error: str) -> None:
+    self.journal.skipped.append([file, error])
+    self.advance()
+
+  def advance(self) -> None:
+    self.journal.done += 1
+    self.pending += 1
+    if self.compression:
+      return
+    if self.pending >= JOURNAL_EVERY_FILES or time.monotonic() - self.last_commit >= JOURNAL_EVERY_SECONDS:
+      self.commit()
+
+  def commit(self) -> None:
+    if self.compression:
+      return
+    self.writer.close()
+    with open(segment_path(self.record_path), 'rb') as segment, open(self.record_path, 'ab') as record:
+      shutil.copyfileobj(segment, record, 1024 * 1024)
+      record.flush()
+      os.fsync(record.fileno())
+      self.journal.offset = record.tell()
+    # 合併欄位，避免 journal.columns 隨筆數增長成大量小陣列
+    self.journal.columns = [concat_columns(self.journal.columns)] if self.journal.columns else []
+    self.journal.save(self.record_path)
+    self.pending = 0
+    self.last_commit = time.monotonic()
+    self.writer = record_writer(segment_path(self.record_path))
+
+  def close(self) -> RecordJournal:
+    self.commit()
+    self.writer.close()
+    if self.compression:
+      self.journal.offset = os.path.getsize(self.record_path)
+    Path(segment_path(self.record_path)).unlink(missing_ok=True)
+    if self.journal.skipped:
+      with open(skipped_path(self.record_path), 'w', encoding='utf8') as fid:
+        json.dump(self.journal.skipped, fid, ensure_ascii=False, indent=2)
+    else:
+      Path(skipped_path(self.record_path)).unlink(missing_ok=True)
+    return self.journal
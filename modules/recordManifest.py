@@ -0,0 +1,97 @@
+import os
+import json
+import zlib
+import hashlib
+from pathlib import Path
+from modules.recordIndex import index_path
+
+
+MANIFEST_NAME = 'manifest.json'
+
+def file_stat(path: str):
+  # [大小, 修改時間]，檔案不存在時為 None
+  try:
+    stat = os.stat(path)
+  except FileNotFoundError:
+    return None
+  return [stat.st_size, stat.st_mtime_ns]
+
+def content_hash(paths: list) -> str:
+  digest = hashlib.sha1()
+  for path in paths:
+    if not os.path.exists(path):
+      continue
+    with open(path, 'rb') as fid:
+      for chunk in iter(lambda: fid.read(1024 * 1024), b''):
+        digest.update(chunk)
+  return digest.hexdigest()
+
+def load_manifest(save_dir: str) -> dict:
+  manifest_path = Path(save_dir) / MANIFEST_NAME
+  if not manifest_path.exists():
+    return {}
+  try:
+    with open(manifest_path, 'r', encoding='utf8') as fid:
+      return json.load(fid)
+  except (OSError, ValueError) as e:
+    print(f'Ignoring unreadable manifest {manifest_path}: {e}')
+    return {}
+
+def save_manifest(save_dir: str, manifest: dict) -> None:
+  manifest_path = Path(save_dir) / MANIFEST_NAME
+  tmp_path = manifest_path.with_suffix('.tmp')
+  with open(tmp_path, 'w', encoding='utf8') as fid:
+    json.dump(manifest, fid, ensure_ascii=False)
+  os.replace(tmp_path, manifest_path)
+
+def file_entry(annotation_path: str, image_path: str, previous: dict = None) -> tuple:
+  # 大小與修改時間相同時直接沿用舊紀錄；否則比對內容雜湊，只被 touch 過的檔案不會觸發重建
+  # 第一次建置時也計算雜湊，之後 touch 才有可比對的內容
+  entry = {'annotation': file_stat(annotation_path), 'image': file_stat(image_path), 'hash': None}
+  if previous is None:
+    entry['hash'] = content_hash([annotation_path, image_path])
+    return entry, True
+
+  if entry['annotation'] == previous.get('annotation') and entry['image'] == previous.get('image'):
+    entry['hash'] = previous.get('hash')
+    return entry, False
+
+  entry['hash'] = content_hash([annotation_path, image_path])
+  return entry, entry['hash'] != previous.get('hash')
+
+def plan_shards(shards: list, section: dict, settings: dict) -> tuple:
+  # shards: [(save_path, [(relative, annotation_path, image_path), ...]), ...]
+  # 回傳 (entries, dirty)：entries 為新的檔案紀錄，dirty 為需要重建的分片索引
+  previous_files = section.get('files', {}) if section.get('settings') == settings else {}
+  previous_shards = {}
+  for relative, entry in previous_files.items():
+    previous_shards.setdefault(entry.get('shard'), set()).add(relative)
+
+  entries, dirty = {}, []
+  for index, (save_path, sources) in enumerate(shards):
+    changed = (not os.path.exists(save_path) or not os.path.exists(index_path(save_path))
+               or previous_shards.get(index, set()) != {source[0] for source in sources})
+    for relative, annotation_path, image_path in sources:
+      entry, file_changed = file_entry(annotation_path, image_path, previous_files.get(relative))
+      entry['shard'] = index
+      entries[relative] = entry
+      changed = changed or file_changed
+    if changed:
+      dirty.append(index)
+  return entries, dirty
+
+def relative_source(file: str, target_dir: str) -> str:
+  return Path(file).relative_to(Path(target_dir).absolute()).as_posix()
+
+def shuffle_key(relative: str, seed: int) -> bytes:
+  return hashlib.blake2b(f'{seed}:{relative}'.encode('utf8'), digest_size=8).digest()
+
+def assign_shards(all_files: list, target_dir: str, num_shards: int, seed: int = 0) -> list:
+  # 以相對路徑的雜湊決定分片，新增或修改檔案只會影響所在的分片
+  # 寫入順序為固定 seed 的全域洗牌，同一批拍攝或同一類別的影像不會在分片內連續出現，
+  # 訓練時只需較小的 shuffle buffer
+  shard_files = [[] for _ in range(num_shards)]
+  for file in sorted(all_files, key=lambda file: (shuffle_key(relative_source(file, target_dir), seed), file)):
+    relative = relative_source(file, target_dir)
+    shard_files[zlib.crc32(relative.encode('utf8')) % num_shards].append(file)
+  return shard_files
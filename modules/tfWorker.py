@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import runpy
+import signal
+import importlib
+import threading
+import traceback
+import subprocess
+from multiprocessing.connection import Client, Listener
+from multiprocessing.reduction import recv_handle, send_handle
+from pathlib import Path
+
+
+# 常駐的 fork server：先匯入 TensorFlow 與 OD API，每個工作 fork 一個子進程執行 script/*.py，省下每次 10–30 秒的匯入時間
+# 只匯入模組，不可建立 TF context 或 session，否則 fork 出的子進程會繼承已啟動的執行緒池
+# 注意：oneDNN/OpenMP 在載入函式庫時就讀取 OMP_NUM_THREADS，fork 出的子進程中修改此環境變數沒有作用，
+# 需要指定 OMP_NUM_THREADS 的工作（例如調校）必須以一般方式啟動
+# script/benchmark_worker_start.py 實測（TensorFlow 2.15 CPU，匯入 tensorflow 與 OD API 的 config_util、label_map_util）：
+# 冷啟動 5.21 秒、經由 fork server 0.11 秒；尚未在訓練主機以完整的 model_lib_v2 量測，預設不使用，設定 OD_WARM_WORKER=1 啟用
+WARM_ENV = 'OD_WARM_WORKER'
+SOCKET_PATH = Path('.cache') / 'tf_worker.sock'
+LOG_PATH = Path('.cache') / 'tf_worker.log'
+PRELOAD_MODULES = [
+  'tensorflow',
+  'object_detection.model_lib_v2',
+  'object_detection.exporter_lib_v2',
+  'object_detection.utils.config_util',
+  'object_detection.utils.label_map_util',
+]
+# 等待 fork server 啟動完成的時間（秒）
+START_TIMEOUT = 120
+
+def supported() -> bool:
+  return hasattr(os, 'fork') and hasattr(os, 'sched_setaffinity')
+
+def enabled() -> bool:
+  return supported() and os.environ.get(WARM_ENV) == '1'
+
+def python_command(executable: str = 'python') -> list:
+  # 啟動 script/*.py 的指令前綴：啟用時經由 fork server，否則為一般的 python
+  return [executable, '-m', 'modules.tfWorker', 'run'] if enabled() else [executable]
+
+def connect(address=SOCKET_PATH):
+  try:
+    return Client(str(address), 'AF_UNIX')
+  except (OSError, EOFError):
+    return None
+
+def ping(address=SOCKET_PATH) -> bool:
+  conn = connect(address)
+  if conn is None:
+    return False
+  try:
+    conn.send({'ping': True})
+    return conn.recv() == 'pong'
+  except (OSError, EOFError):
+    return False
+  finally:
+    conn.close()
+
+def run_child(request: dict, fds: list, inherited: list) -> None:
+  # 在 fork 出的子進程中執行腳本，相當於 python <script> <args>
+  # 關閉繼承自 fork server 的 listener 與所有連線（包含其他工作的），fork server 結束時各工作的呼叫端才會收到 EOF
+  for conn in inherited:
+    conn.close()
+  for fd, target in zip(fds, (0, 1, 2)):
+    os.dup2(fd, target)
+    os.close(fd)
+  sys.stdout.reconfigure(line_buffering=True)
+  sys.stderr.reconfigure(line_buffering=True)
+  os.chdir(request['cwd'])
+  os.environ.clear()
+  os.environ.update(request['env'])
+  if request.get('cpus'):
+    os.sched_setaffinity(0, request['cpus'])
+  # fork 出的進程繼承的是 fork server 的優先權，改為與呼叫端相同
+  try:
+    os.setpriority(os.PRIO_PROCESS, 0, request.get('priority', 0))
+  except (OSError, AttributeError):
+    pass
+  signal.signal(signal.SIGTERM, signal.SIG_DFL)
+  sys.argv = list(request['argv'])
+  sys.path[0] = str(Path(sys.argv[0]).resolve().parent)
+  code = 0
+  try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+  except SystemExit as e:
+    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+  except BaseException:
+    traceback.print_exc()
+    code = 1
+  sys.stdout.flush()
+  sys.stderr.flush()
+  os._exit(code)
+
+def exit_code(status: int) -> int:
+  # 與 subprocess 相同：被訊號終止時為負的訊號編號（os.waitstatus_to_exitcode 需要 Python 3.9）
+  if os.WIFSIGNALED(status):
+    return -os.WTERMSIG(status)
+  return os.WEXITSTATUS(status)
+
+def wait_child(conn, pid: int, connections: set, lock) -> None:
+  _, status = os.waitpid(pid, 0)
+  try:
+    conn.send({'returncode': exit_code(status)})
+  except OSError:
+    pass
+  with lock:
+    connections.discard(conn)
+  conn.close()
+
+def serve(address=SOCKET_PATH) -> None:
+  for name in PRELOAD_MODULES:
+    importlib.import_module(name)
+  Path(address).parent.mkdir(parents=True, exist_ok=True)
+  if Path(address).exists():
+    Path(address).unlink()
+  # Python 建立的 socket 預設不可繼承（close-on-exec）；fork 不會 exec，因此子進程另外關閉 run_child 的 inherited
+  listener = Listener(str(address), 'AF_UNIX')
+  print(f'tf worker ready: {address}', flush=True)
+  # 執行中工作的連線，由等待子進程的執行緒回報結束碼
+  connections, lock = set(), threading.Lock()
+  # 在主執行緒接收請求並 fork，等待子進程結束由各自的執行緒回報
+  while True:
+    conn = listener.accept()
+    try:
+      request = conn.recv()
+      if request.get('ping'):
+        conn.send('pong')
+        conn.close()
+        continue
+      fds = [recv_handle(conn) for _ in range(3)]
+    except (OSError, EOFError):
+      conn.close()
+      continue
+    with lock:
+      inherited = [listener, conn, *connections]
+      pid = os.fork()
+      if pid == 0:
+        run_child(request, fds, inherited)
+      connections.add(conn)
+    for fd in fds:
+      os.close(fd)
+    conn.send({'pid': pid})
+    threading.Thread(target=wait_child, args=(conn, pid, connections, lock), daemon=True).start()
+
+def ensure_worker(address=SOCKET_PATH) -> bool:
+  # 啟動獨立 session 的 fork server，網頁伺服器重啟時沿用同一個
+  if not supported():
+    return False
+  if ping(address):
+    return True
+  LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+  with open(LOG_PATH, 'a') as log:
+    subprocess.Popen([sys.executable, '-m', 'modules.tfWorker', 'serve'], stdin=subprocess.DEVNULL,
+                     stdout=log, stderr=log, start_new_session=True)
+  return True
+
+def wait_worker(address=SOCKET_PATH, timeout: float = START_TIMEOUT) -> bool:
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if ping(address):
+      return True
+    time.sleep(0.5)
+  return False
+
+def run(argv: list, address=SOCKET_PATH) -> int:
+  # 由 fork server 執行 python <argv>，stdin/stdout/stderr 交給子進程直接使用；fork server 不存在時改為一般啟動
+  conn = connect(address) if supported() else None
+  if conn is None:
+    return subprocess.call([sys.executable, *argv])
+  # 在得知子進程 pid 之前收到的訊號先記下，之後轉送，避免呼叫端被終止而子進程繼續執行
+  received = []
+  signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+  signal.signal(signal.SIGINT, lambda signum, frame: received.append(signum))
+  conn.send({'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ), 'cpus': sorted(os.sched_getaffinity(0)),
+             'priority': os.getpriority(os.PRIO_PROCESS, 0)})
+  for fd in (0, 1, 2):
+    send_handle(conn, fd, None)
+  pid = conn.recv()['pid']
+  # 子進程不是本進程的子進程，記錄到工作中讓取消與暫停可以找到它
+  if os.environ.get('OD_JOB_DIR'):
+    from modules.jobManager import update_job
+    if update_job(os.environ['OD_JOB_DIR'], worker_pid=pid).get('cancelled'):
+      received.append(signal.SIGTERM)
+  signal.signal(signal.SIGTERM, lambda signum, frame: os.kill(pid, signal.SIGTERM))
+  signal.signal(signal.SIGINT, lambda signum, frame: os.kill(pid, signal.SIGINT))
+  for signum in received:
+    os.kill(pid, signum)
+  try:
+    return conn.recv()['returncode']
+  except EOFError:
+    # fork server 已結束，拿不到結束碼；等子進程結束再回報失敗，工作狀態才不會提早結束
+    from modules.jobManager import pid_alive
+    while pid_alive(pid):
+      time.sleep(1)
+    return 1
+
+if __name__ == '__main__':
+  if len(sys.argv) >= 2 and sys.argv[1] == 'serve':
+    serve()
+  elif len(sys.argv) >= 3 and sys.argv[1] == 'run':
+    sys.exit(run(sys.argv[2:]))
+  else:
+    print('usage: python -m modules.tfWorker serve | run <script.py> [args...]', file=sys.stderr)
+    sys.exit(2)
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+METRICS_NAME = 'training_metrics.jsonl'
+EVAL_METRICS_NAME = 'eval_metrics.jsonl'
+# model_lib_v2 每 100 步輸出：
+#   Step 1200 per-step time 0.812s
+#   {'Loss/classification_loss': 0.21,
+#    'Loss/localization_loss': 0.1,
+#    'learning_rate': 0.0133}
+STEP_PATTERN = re.compile(r'Step (\d+) per-step time ([\d.]+)s')
+VALUE_PATTERN = re.compile(r"'([\w/.]+)':\s*(?:np\.float\d+\()?([-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|nan|inf))")
+# 評估程序（model_main_tf2 --checkpoint_dir）每個 checkpoint 輸出：
+#   Eval metrics at step 1200
+#   	+ DetectionBoxes_Precision/mAP: 0.412000
+#   	+ DetectionBoxes_Recall/AR@100 (small): 0.100000
+EVAL_STEP_PATTERN = re.compile(r'Eval metrics at step (\d+)')
+EVAL_VALUE_PATTERN = re.compile(r'\+ (.+?): ([-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|nan|inf))\s*$')
+MAP_PREFIX = 'DetectionBoxes_Precision/mAP'
+SERIES_CAPACITY = 1000
+
+def metrics_path(checkpoint_dir: str) -> Path:
+  return Path(checkpoint_dir) / METRICS_NAME
+
+def eval_metrics_path(checkpoint_dir: str) -> Path:
+  return Path(checkpoint_dir) / EVAL_METRICS_NAME
+
+class MetricSeries:
+  # 固定容量的時間序列：寫滿時每兩點保留一點，之後只收 stride 的倍數，整段訓練過程都看得到且記憶體不增長
+  def __init__(self, capacity: int = SERIES_CAPACITY):
+    self.capacity = capacity
+    self.columns = {}
+    self.size = 0
+    self.stride = 1
+    self.count = 0
+
+  def append(self, record: dict) -> None:
+    self.count += 1
+    if (self.count - 1) % self.stride:
+      return
+    if self.size == self.capacity:
+      for name in self.columns:
+        kept = self.columns[name][:self.size:2]
+        self.columns[name][:len(kept)] = kept
+      self.size = len(kept)
+      self.stride *= 2
+    for name, value in record.items():
+      if name not in self.columns:
+        self.columns[name] = np.full(self.capacity, np.nan)
+      self.columns[name][self.size] = value
+    for name in self.columns.keys() - record.keys():
+      self.columns[name][self.size] = np.nan
+    self.size += 1
+
+  def column(self, name: str) -> np.ndarray:
+    return self.columns[name][:self.size] if name in self.columns else np.zeros(0)
+
+class TrainingMetrics:
+  # 由訓練輸出逐行解析步數、每步時間、學習率與各項 loss，寫入記憶體中的序列與任務的 metrics 檔
+  def __init__(self, save_path: str = None, run: str = None):
+    self.save_path = save_path
+    self.run = run or datetime.now().isoformat(timespec='seconds')
+    self.series = MetricSeries()
+    self.pending = None
+    self.evaluating = False
+    self.lock = threading.Lock()
+
+  def feed(self, line: str) -> None:
+    with self.lock:
+      match = EVAL_STEP_PATTERN.search(line)
+      if match:
+        self.commit()
+        self.pending = {'step': int(match.group(1))}
+        self.evaluating = True
+        return
+      if self.evaluating:
+        # 評估結果是連續的「+ 名稱: 數值」，遇到其他行即結束
+        value = EVAL_VALUE_PATTERN.search(line)
+        if value:
+          self.pending[value.group(1)] = float(value.group(2))
+          return
+        self.evaluating = False
+        self.commit()
+      match = STEP_PATTERN.search(line)
+      if match:
+        self.commit()
+        step, per_step_time = int(match.group(1)), float(match.group(2))
+        self.pending = {'step': step, 'per_step_time': per_step_time,
+                        'steps_per_sec': 1.0 / per_step_time if per_step_time > 0 else np.nan}
+        return
+      if self.pending is None:
+        return
+      for name, value in VALUE_PATTERN.findall(line):
+        self.pending[name] = float(value)
+      if line.rstrip().endswith('}'):
+        self.commit()
+
+  def commit(self) -> None:
+    if self.pending is None:
+      return
+    record, self.pending = self.pending, None
+    self.series.append(record)
+    if self.save_path:
+      with open(self.save_path, 'a', encoding='utf8') as fid:
+        fid.write(json.dumps({'run': self.run, **record}) + '\n')
+
+  def frames(self) -> tuple:
+    with self.lock:
+      return metrics_frames({self.run: self.series})
+
+class MetricsFile:
+  # 記住已讀取的位移，每次只解析新增的完整行，輪詢成本不隨訓練時間增長；檔案被截斷或取代時重新讀取
+  def __init__(self, path: str):
+    self.path = path
+    self.lock = threading.Lock()
+    self.reset(None)
+
+  def reset(self, inode) -> None:
+    self.inode = inode
+    self.offset = 0
+    self.runs = {}
+
+  def load(self) -> dict:
+    with self.lock:
+      try:
+        stat = os.stat(self.path)
+      except FileNotFoundError:
+        self.reset(None)
+        return {}
+      if stat.st_ino != self.inode or stat.st_size < self.offset:
+        self.reset(stat.st_ino)
+      if stat.st_size > self.offset:
+        with open(self.path, 'rb') as fid:
+          fid.seek(self.offset)
+          data = fid.read(stat.st_size - self.offset)
+        # 寫到一半的最後一行留到下次讀取
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+          try:
+            record = json.loads(line)
+          except ValueError:
+            continue
+          self.runs.setdefault(record.pop('run', ''), MetricSeries()).append(record)
+        self.offset += end
+      return dict(self.runs)
+
+@lru_cache(maxsize=16)
+def metrics_file(path: str) -> MetricsFile:
+  return MetricsFile(path)
+
+def load_metrics(save_path: str) -> dict:
+  # 回傳 {run: MetricSeries}，比較不同次訓練的速度
+  return metrics_file(str(Path(save_path).absolute())).load()
+
+def metrics_frames(runs: dict) -> tuple:
+  # 回傳 (loss, speed) 兩個長格式的 DataFrame，loss 只畫最近一次訓練，speed 比較所有訓練
+  loss_rows, speed_rows = [], []
+  for index, (run, series) in enumerate(runs.items()):
+    steps = series.column('step')
+    speed_rows.append(pd.DataFrame({'step': steps, 'steps_per_sec': series.column('steps_per_sec'), 'run': run}))
+    if index == len(runs) - 1:
+      for name in series.columns:
+        if name.startswith('Loss/'):
+          loss_rows.append(pd.DataFrame({'step': steps, 'value': series.column(name), 'metric': name}))
+  empty_loss = pd.DataFrame({'step': [], 'value': [], 'metric': []})
+  empty_speed = pd.DataFrame({'step': [], 'steps_per_sec': [], 'run': []})
+  return (pd.concat(loss_rows, ignore_index=True).dropna() if loss_rows else empty_loss,
+          pd.concat(speed_rows, ignore_index=True).dropna() if speed_rows else empty_speed)
+
+def eval_frame(runs: dict) -> pd.DataFrame:
+  # 最近一次評估程序的 mAP 系列，長格式 (step, value, metric)
+  rows = []
+  for run, series in list(runs.items())[-1:]:
+    for name in series.columns:
+      if name.startswith(MAP_PREFIX):
+        rows.append(pd.DataFrame({'step': series.column('step'), 'value': series.column(name), 'metric': name}))
+  if not rows:
+    return pd.DataFrame({'step': [], 'value': [], 'metric': []})
+  return pd.concat(rows, ignore_index=True).dropna()
+
+def eval_summary(runs: dict) -> str:
+  # 最新一次評估的 mAP，例如「評估 step 1200: mAP 0.412, mAP@.50IOU 0.713」
+  if not runs:
+    return ''
+  series = list(runs.values())[-1]
+  if not series.size:
+    return ''
+  values = [f"{name[len(MAP_PREFIX) - 3:]} {series.column(name)[-1]:.3f}"
+            for name in series.columns if name.startswith(MAP_PREFIX) and not np.isnan(series.column(name)[-1])]
+  return f"評估 step {int(series.column('step')[-1])}: {', '.join(values)}" if values else ''
+
+def checkpoint_frames(checkpoint_dir: str) -> tuple:
+  # 回傳 (loss, speed, mAP) 三個圖表的資料
+  return (*metrics_frames(load_metrics(metrics_path(checkpoint_dir))),
+          eval_frame(load_metrics(eval_metrics_path(checkpoint_dir))))
@@ -0,0 +1,77 @@
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+
+
+# 調校結果存於 setting.json 的 "tuning"，之後每次 train() 都會套用
+TUNING_KEY = 'tuning'
+# train_input_config 的欄位：讀取 TFRecord 的並行數、每批次的平行解碼數（乘以 batch size）、預取批次數
+INPUT_KNOBS = ('num_readers', 'num_parallel_batches', 'num_prefetch_batches')
+# model_main_tf2 的參數
+THREAD_KNOBS = ('intra_op_threads', 'inter_op_threads')
+ENV_KNOBS = {'omp_num_threads': 'OMP_NUM_THREADS'}
+KNOBS = THREAD_KNOBS + tuple(ENV_KNOBS) + INPUT_KNOBS
+
+def tuning_grid(cpus: int) -> dict:
+  # 每個參數的候選值，依核心數調整
+  def unique(values):
+    return sorted({max(1, value) for value in values}, reverse=True)
+  return {
+    'intra_op_threads': unique([cpus, cpus // 2, cpus // 4]),
+    'inter_op_threads': [1, 2, 4],
+    'omp_num_threads': unique([cpus, cpus // 2, 1]),
+    'num_readers': [1, 4, 16],
+    'num_parallel_batches': [2, 4, 8],
+    'num_prefetch_batches': [1, 2, 4],
+  }
+
+def tuning_overrides(tuning: dict) -> dict:
+  return {f'train_input_config.{name}': int(tuning[name]) for name in INPUT_KNOBS if tuning.get(name)}
+
+def tuning_args(tuning: dict) -> list:
+  return [arg for name in THREAD_KNOBS if tuning.get(name) for arg in (f'--{name}', str(int(tuning[name])))]
+
+def tuning_env(tuning: dict) -> dict:
+  return {env: str(int(tuning[name])) for name, env in ENV_KNOBS.items() if tuning.get(name)}
+
+def format_tuning(tuning: dict) -> str:
+  return ', '.join(f'{name}={tuning[name]}' for name in KNOBS if name in tuning) or '預設值'
+
+def settings_path(project_name: str) -> Path:
+  return Path('projects') / project_name / 'setting.json'
+
+def scale_tuning(tuning: dict, tuned_cpus: int, cores: int) -> dict:
+  # 調校時使用 tuned_cpus 個核心；工作分配到的核心數不同時，依比例調整執行緒數量並限制在 cores 以內，避免超額使用
+  if not tuned_cpus or not cores or tuned_cpus == cores:
+    return dict(tuning)
+  scaled = dict(tuning)
+  for name in ('intra_op_threads', 'omp_num_threads'):
+    if tuning.get(name):
+      scaled[name] = max(1, min(cores, round(tuning[name] * cores / tuned_cpus)))
+  if tuning.get('inter_op_threads'):
+    scaled['inter_op_threads'] = max(1, min(cores, tuning['inter_op_threads']))
+  return scaled
+
+def load_tuning(project_name: str, cores: int = None) -> dict:
+  # cores 為工作分配到的核心數，None 時不調整
+  path = settings_path(project_name)
+  if not project_name or not path.exists():
+    return {}
+  with open(path, 'r') as f:
+    tuning = json.load(f).get(TUNING_KEY) or {}
+  return scale_tuning({name: tuning[name] for name in KNOBS if name in tuning}, tuning.get('cpus'), cores)
+
+def save_tuning(project_name: str, tuning: dict, steps_per_sec: float, cpus: int) -> None:
+  # 只改寫 "tuning"，保留 setting.json 的其他設定
+  path = settings_path(project_name)
+  settings = {}
+  if path.exists():
+    with open(path, 'r') as f:
+      settings = json.load(f)
+  settings[TUNING_KEY] = {**tuning, 'steps_per_sec': steps_per_sec, 'cpus': cpus,
+                          'tuned': datetime.now().isoformat(timespec='seconds')}
+  tmp_path = path.with_suffix('.tmp')
+  with open(tmp_path, 'w') as f:
+    json.dump(settings, f, indent=2)
+  os.replace(tmp_path, path)
@@ -0,0 +1,45 @@
+import numpy as np
+from lxml import etree
+
+
+BNDBOX_KEYS = ('xmin', 'ymin', 'xmax', 'ymax')
+# 整份標註只做一次 C 層級的解析，再以預先編譯的 XPath 一次取出所有欄位，
+# 不建立 recursive_parse_xml_to_dict 的巢狀 dict
+PARSER = etree.XMLParser(collect_ids=False, resolve_entities=False)
+OBJECT_COUNT = etree.XPath('count(object)')
+OBJECT_NAMES = etree.XPath('object/name/text()', smart_strings=False)
+OBJECT_COORDS = [etree.XPath(f'object/bndbox/{key}/text()', smart_strings=False) for key in BNDBOX_KEYS]
+
+def object_arrays(root) -> tuple:
+  # 每個 object 欄位齊全時四個座標清單等長，可直接組成陣列；否則逐一檢查以回報缺少的欄位
+  labels = OBJECT_NAMES(root)
+  coords = [xpath(root) for xpath in OBJECT_COORDS]
+  num_objects = int(OBJECT_COUNT(root))
+  if all(len(values) == num_objects for values in [labels, *coords]):
+    return labels, np.array(coords, dtype=np.float32).T.reshape(-1, 4)
+
+  for obj in root.iterfind('object'):
+    if obj.findtext('name') is None:
+      raise ValueError('Missing key \'name\' in object data')
+    for key in BNDBOX_KEYS:
+      if obj.findtext(f'bndbox/{key}') is None:
+        raise ValueError(f'Missing key \'{key}\' in object data')
+  raise ValueError('Malformed object data')
+
+def read_voc(file: str) -> dict:
+  # 回傳 {'filename', 'width', 'height', 'labels', 'boxes'}，boxes 為 (N, 4) 的 xmin, ymin, xmax, ymax
+  try:
+    with open(file, 'rb') as fid:
+      root = etree.fromstring(fid.read(), PARSER)
+    labels, boxes = object_arrays(root)
+    return {
+      'filename': root.findtext('filename') or '',
+      'width': int(float(root.findtext('size/width') or 0)),
+      'height': int(float(root.findtext('size/height') or 0)),
+      'labels': labels,
+      'boxes': boxes,
+    }
+  except etree.XMLSyntaxError as e:
+    raise ValueError(f'Invalid XML annotation {file}: {e}')
+  except ValueError as e:
+    raise ValueError(f'{e}: {file}')
@@ -0,0 +1,114 @@
+"""Tune TensorFlow threading and tf.data input settings for CPU training.
+
+Runs short training bursts on the project's real TFRecords and measures
+steps/sec from the per-100-step timing that model_lib_v2 logs. A full grid
+over six knobs would take hundreds of bursts, so the knobs are swept one at
+a time: each candidate value is tried with the best values found so far, and
+the fastest value is kept before moving to the next knob. Each setting is
+measured --repeats times and the median is used; a value only replaces the
+best so far when it is faster by more than --min_improvement, so burst-to-
+burst noise does not pick a random winner. The winner is written to the
+project's setting.json under "tuning" and applied by every later training
+run, with thread counts scaled to the cores that run is given.
+
+Trials that set OMP_NUM_THREADS are always started in a fresh interpreter:
+OpenMP reads it when the library loads, so it has no effect in children of
+the warm tfWorker fork server.
+
+Usage:
+  python script/autotune_train.py --project_name demo --task_name run1 \
+      --reference_model faster_rcnn_resnet50_v1_1024x1024_coco17_tpu-8 --batch_size 4
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.genRecord import record_compression  # noqa: E402
+from modules.pipelineConfig import save_pipeline  # noqa: E402
+from modules.tfWorker import python_command  # noqa: E402
+from modules.trainMetrics import TrainingMetrics  # noqa: E402
+from modules.trainTuning import format_tuning, save_tuning, tuning_env, tuning_grid  # noqa: E402
+from webui.od import build_train_config  # noqa: E402
+
+
+def measure(args, tuning, trial_dir):
+  # 重複 args.repeats 次取中位數
+  return statistics.median(measure_once(args, tuning, trial_dir) for _ in range(args.repeats))
+
+def measure_once(args, tuning, trial_dir):
+  # 回傳這組設定的 steps/sec；第一次輸出包含載入 checkpoint 與建圖的時間，不計入
+  pipeline_config, train_args = build_train_config(args.project_name, args.task_name, args.batch_size,
+                                                   args.burst_steps, args.reference_model, tuning=tuning)
+  save_pipeline(pipeline_config, trial_dir)
+  model_dir = Path(trial_dir) / 'model'
+  shutil.rmtree(model_dir, ignore_errors=True)
+  compression = record_compression(f'./projects/{args.project_name}/TFRecord/{args.task_name}', 'train')
+  # 指定 OMP_NUM_THREADS 時必須以一般方式啟動才會生效
+  python = [sys.executable] if tuning.get('omp_num_threads') else python_command(sys.executable)
+  process = subprocess.Popen(
+    [*python, 'script/model_main_tf2.py',
+     '--pipeline_config_path', str(Path(trial_dir) / 'pipeline.config'),
+     '--model_dir', str(model_dir),
+     '--checkpoint_every_n', str(args.burst_steps * 10),
+     '--record_compression', compression,
+     *train_args],
+    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    env={**os.environ, 'PYTHONUNBUFFERED': '1', **tuning_env(tuning)}
+  )
+  metrics = TrainingMetrics()
+  tail = []
+  for line in process.stdout:
+    metrics.feed(line)
+    tail = (tail + [line.rstrip()])[-20:]
+  process.wait()
+  metrics.commit()
+  shutil.rmtree(model_dir, ignore_errors=True)
+  speeds = metrics.series.column('steps_per_sec')[1:]
+  if process.returncode != 0 or not len(speeds):
+    print('\n'.join(tail), flush=True)
+    return 0.0
+  return statistics.median(speeds)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--project_name', required=True)
+  parser.add_argument('--task_name', required=True)
+  parser.add_argument('--reference_model', required=True)
+  parser.add_argument('--batch_size', type=int, default=1)
+  parser.add_argument('--burst_steps', type=int, default=300, help='training steps per trial, at least 200')
+  parser.add_argument('--repeats', type=int, default=2, help='bursts per setting, the median is used')
+  parser.add_argument('--min_improvement', type=float, default=0.03,
+                      help='relative speedup required to replace the best setting')
+  args = parser.parse_args()
+
+  cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+  trial_dir = f'./projects/{args.project_name}/Tuning/{args.task_name}'
+  print(f'{cpus} cores, {args.burst_steps} steps x {args.repeats} per trial', flush=True)
+
+  best = {}
+  best_speed = measure(args, best, trial_dir)
+  print(f'baseline ({format_tuning(best)}): {best_speed:.3f} steps/sec', flush=True)
+  for name, values in tuning_grid(cpus).items():
+    current = dict(best)
+    for value in values:
+      tuning = {**current, name: value}
+      speed = measure(args, tuning, trial_dir)
+      print(f'{format_tuning(tuning)}: {speed:.3f} steps/sec', flush=True)
+      if speed > best_speed * (1 + args.min_improvement):
+        best, best_speed = tuning, speed
+  shutil.rmtree(trial_dir, ignore_errors=True)
+
+  if not best_speed:
+    print('all trials failed, settings not saved', flush=True)
+    return 1
+  save_tuning(args.project_name, best, best_speed, cpus)
+  print(f'best ({format_tuning(best)}): {best_speed:.3f} steps/sec, saved to setting.json', flush=True)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
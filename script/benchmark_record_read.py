@@ -0,0 +1,86 @@
+"""Compare TFRecord size and tf.data read throughput for each compression type.
+
+The first --num_records examples of a converted dataset are rewritten without
+compression, with GZIP and with ZLIB. Each copy is read back with
+TFRecordDataset, parsed, and its JPEGs decoded.
+
+Usage:
+  python script/benchmark_record_read.py --record_dir ./projects/<project>/TFRecord/<task>
+  python script/benchmark_record_read.py --record_dir ./projects/<project>/TFRecord/<task> --no_decode
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import tensorflow as tf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.genRecord import record_compression, shard_pattern  # noqa: E402
+
+
+COMPRESSIONS = ('', 'GZIP', 'ZLIB')
+FEATURES = {
+  'image/encoded': tf.io.FixedLenFeature([], tf.string),
+  'image/object/bbox/xmin': tf.io.VarLenFeature(tf.float32),
+  'image/object/class/label': tf.io.VarLenFeature(tf.int64),
+}
+
+def load_records(record_dir, record_type, num_records):
+  paths = sorted(str(path) for path in Path(record_dir).glob(shard_pattern(record_type)))
+  if not paths:
+    paths = [str(Path(record_dir) / f'{record_type}.record')]
+  dataset = tf.data.TFRecordDataset(paths, compression_type=record_compression(record_dir, record_type))
+  return [record.numpy() for record in dataset.take(num_records)]
+
+def write_records(path, records, compression):
+  with tf.io.TFRecordWriter(path, tf.io.TFRecordOptions(compression_type=compression)) as writer:
+    for record in records:
+      writer.write(record)
+
+def parse(serialized, decode):
+  example = tf.io.parse_single_example(serialized, FEATURES)
+  if decode:
+    return tf.shape(tf.io.decode_jpeg(example['image/encoded'], channels=3))
+  return tf.size(example['image/object/class/label'])
+
+def read_throughput(path, compression, decode, num_parallel_reads, repeat):
+  best = float('inf')
+  for _ in range(repeat):
+    dataset = tf.data.TFRecordDataset(path, compression_type=compression, buffer_size=8 * 1000 * 1000,
+                                      num_parallel_reads=num_parallel_reads)
+    dataset = dataset.map(lambda record: parse(record, decode), num_parallel_calls=tf.data.AUTOTUNE)
+    start = time.perf_counter()
+    count = sum(1 for _ in dataset)
+    best = min(best, time.perf_counter() - start)
+  return count, best
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--record_dir', required=True, help='TFRecord folder of a converted task.')
+  parser.add_argument('--record_type', default='train', choices=['train', 'test'])
+  parser.add_argument('--num_records', type=int, default=1000)
+  parser.add_argument('--num_parallel_reads', type=int, default=None)
+  parser.add_argument('--no_decode', action='store_true', help='Only parse examples, skip JPEG decoding.')
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  records = load_records(args.record_dir, args.record_type, args.num_records)
+  if not records:
+    sys.exit(f'No {args.record_type} records found in {args.record_dir}')
+
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    print(f'{"compression":>11} {"size MB":>9} {"ratio":>6} {"records/s":>10} {"MB/s read":>10}')
+    base_size = None
+    for compression in COMPRESSIONS:
+      path = str(Path(tmp_dir) / f'{compression or "NONE"}.record')
+      write_records(path, records, compression)
+      size = Path(path).stat().st_size
+      base_size = base_size or size
+      count, seconds = read_throughput(path, compression, not args.no_decode, args.num_parallel_reads, args.repeat)
+      print(f'{compression or "NONE":>11} {size / 1024 / 1024:>9.1f} {size / base_size:>6.2f} '
+            f'{count / seconds:>10.0f} {size / 1024 / 1024 / seconds:>10.1f}')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+"""Benchmark modules.vocReader against the recursive_parse_xml_to_dict path.
+
+Usage:
+  python script/benchmark_voc_reader.py --dataset_dir ./datasets/<project>/train
+  python script/benchmark_voc_reader.py --num_files 2000 --objects_per_file 50
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.vocReader import read_voc  # noqa: E402
+
+
+def parse_with_dict(file):
+  # 原本的轉換路徑：讀入字串、建立完整樹、轉成巢狀 dict 後再走訪
+  from object_detection.utils import dataset_util
+  with open(file, 'rb') as fid:
+    xml = etree.fromstring(fid.read())
+  data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
+  objects = data.get('object', [])
+  labels = [obj['name'] for obj in objects]
+  boxes = np.array([[obj['bndbox'][key] for key in ('xmin', 'ymin', 'xmax', 'ymax')] for obj in objects],
+                   dtype=np.float32).reshape(-1, 4)
+  return labels, boxes
+
+def parse_with_reader(file):
+  annotation = read_voc(file)
+  return annotation['labels'], annotation['boxes']
+
+def write_synthetic(directory, num_files, objects_per_file):
+  rng = np.random.default_rng(0)
+  for index in range(num_files):
+    objects = ''.join(
+      f'<object><name>class_{rng.integers(10)}</name><pose>Unspecified</pose><truncated>0</truncated>'
+      f'<difficult>0</difficult><bndbox><xmin>{x}</xmin><ymin>{y}</ymin><xmax>{x + 40}</xmax><ymax>{y + 30}</ymax>'
+      f'</bndbox></object>'
+      for x, y in rng.integers(0, 900, size=(objects_per_file, 2)))
+    Path(directory, f'{index:06d}.xml').write_text(
+      f'<annotation><folder>images</folder><filename>{index:06d}.jpg</filename>'
+      f'<size><width>1024</width><height>1024</height><depth>3</depth></size>{objects}</annotation>')
+
+def benchmark(name, parse, files, repeat):
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    num_objects = sum(len(parse(file)[0]) for file in files)
+    best = min(best, time.perf_counter() - start)
+  print(f'{name:>8}: {best:.3f}s for {len(files)} files / {num_objects} objects '
+        f'({len(files) / best:.0f} files/s)')
+  return best
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--dataset_dir', help='Folder with VOC xml files; synthetic files are used when omitted.')
+  parser.add_argument('--num_files', type=int, default=1000)
+  parser.add_argument('--objects_per_file', type=int, default=30)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    dataset_dir = args.dataset_dir
+    if not dataset_dir:
+      write_synthetic(tmp_dir, args.num_files, args.objects_per_file)
+      dataset_dir = tmp_dir
+    files = sorted(str(file) for file in Path(dataset_dir).glob('**/*.xml'))
+
+    for file in files[:50]:
+      dict_labels, dict_boxes = parse_with_dict(file)
+      reader_labels, reader_boxes = parse_with_reader(file)
+      assert dict_labels == reader_labels and np.array_equal(dict_boxes, reader_boxes), file
+
+    baseline = benchmark('dict', parse_with_dict, files, args.repeat)
+    reader = benchmark('reader', parse_with_reader, files, args.repeat)
+    print(f'speedup: {baseline / reader:.2f}x')
+
+if __name__ == '__main__':
+  main()
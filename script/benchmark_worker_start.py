@@ -0,0 +1,52 @@
+"""Compare cold and warm start time of the TensorFlow scripts.
+
+Cold starts run `python <script> --helpshort` in a fresh interpreter, which
+imports TensorFlow and the Object Detection API before absl prints the flag
+help and exits. Warm starts send the same command to the tfWorker fork
+server, which already has those modules imported. The fork server is
+started first if it is not running.
+
+Usage:
+  python script/benchmark_worker_start.py
+  python script/benchmark_worker_start.py --script script/model_main_tf2.py --repeats 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.tfWorker import ensure_worker, wait_worker  # noqa: E402
+
+
+def time_command(command, repeats):
+  seconds = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    seconds.append(time.perf_counter() - start)
+  return seconds
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--script', action='append', help='script to start, may be repeated')
+  parser.add_argument('--repeats', type=int, default=3)
+  args = parser.parse_args()
+  scripts = args.script or ['script/exporter_main_v2.py', 'script/model_main_tf2.py']
+
+  if not ensure_worker() or not wait_worker():
+    print('tf worker is not available on this platform or failed to start, see .cache/tf_worker.log')
+    return 1
+
+  print(f'{"script":<32} {"cold (s)":>10} {"warm (s)":>10} {"speedup":>8}')
+  for script in scripts:
+    cold = statistics.median(time_command([sys.executable, script, '--helpshort'], args.repeats))
+    warm = statistics.median(time_command([sys.executable, '-m', 'modules.tfWorker', 'run', script, '--helpshort'],
+                                          args.repeats))
+    print(f'{script:<32} {cold:>10.2f} {warm:>10.2f} {cold / warm:>7.1f}x')
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,43 @@
+"""Convert a project's datasets to TFRecord outside the web UI process.
+
+Launched by the web UI as a background job; the settings are the keyword
+arguments of webui.od.convert_dataset encoded as JSON. Each progress update
+only prints the lines that changed since the previous one, so the job log
+stays readable when tailed.
+
+Usage:
+  python script/convert_dataset.py --settings '{"project_name": "demo", "dataset_format": "xml", "task_name": "run1"}'
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from webui.od import convert_dataset  # noqa: E402
+
+
+def changed_lines(previous, current):
+  same = 0
+  for old, new in zip(previous, current):
+    if old != new:
+      break
+    same += 1
+  return current[same:]
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--settings', required=True, help='JSON encoded keyword arguments of convert_dataset')
+  args = parser.parse_args()
+
+  previous = []
+  for text in convert_dataset(**json.loads(args.settings)):
+    lines = text.splitlines()
+    for line in changed_lines(previous, lines):
+      print(line, flush=True)
+    previous = lines
+  # 最後的訊息是「資料轉換完成」才算成功
+  return 0 if previous and previous[-1] == '資料轉換完成' else 1
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -26,6 +26,9 @@ python model_main_tf2.py -- \
   --pipeline_config_path=$PIPELINE_CONFIG_PATH \
   --alsologtostderr
 """
+import functools
+import os
+
 from absl import flags
 import tensorflow.compat.v2 as tf
 from object_detection import model_lib_v2
@@ -52,6 +55,15 @@ flags.DEFINE_string(
 flags.DEFINE_integer('eval_timeout', 3600, 'Number of seconds to wait for an'
                      'evaluation checkpoint before exiting.')
 
+flags.DEFINE_integer('eval_wait_interval', 300, 'Minimum number of seconds '
+                     'between two evaluations when running in eval mode.')
+
+flags.DEFINE_integer('intra_op_threads', 0, 'Number of threads used within '
+                     'an individual op. 0 lets TensorFlow decide.')
+
+flags.DEFINE_integer('inter_op_threads', 0, 'Number of ops run in parallel. '
+                     '0 lets TensorFlow decide.')
+
 flags.DEFINE_bool('use_tpu', False, 'Whether the job is executing on a TPU.')
 flags.DEFINE_string(
     'tpu_name',
@@ -69,13 +81,93 @@ flags.DEFINE_boolean('record_summaries', True,
                       ' summaries of the loss values which are always'
                       ' recorded.'))
 
+flags.DEFINE_enum('record_compression', '', ['', 'GZIP', 'ZLIB'],
+                  'Compression type of the input TFRecord files.')
+
+flags.DEFINE_integer('bucket_batch_size', None, 'When set, each training '
+                     'batch of this size is drawn from a single aspect-ratio '
+                     'bucket and padded only to its largest image.')
+
 FLAGS = flags.FLAGS
 
 
+def use_record_compression(compression_type):
+  # input_reader.proto has no compression field, so the file_read_func that
+  # dataset_builder.build passes to read_dataset (a TFRecordDataset partial) is
+  # bound to the compression type of the converted records. Only the input
+  # pipeline is affected; tf.data.TFRecordDataset itself is left untouched.
+  from object_detection.builders import dataset_builder
+  read_dataset = dataset_builder.read_dataset
+
+  def compressed_read_dataset(file_read_func, input_files, config,
+                              filename_shard_fn=None):
+    return read_dataset(
+        functools.partial(file_read_func, compression_type=compression_type),
+        input_files, config, filename_shard_fn)
+
+  dataset_builder.read_dataset = compressed_read_dataset
+
+
+def use_bucketed_batches(batch_size):
+  # Records converted with aspect-ratio buckets are stored as one shard set per
+  # bucket (<type>_<bucket>-NNNNN-of-NNNNN.record). Training reads every bucket
+  # separately and emits blocks of batch_size records from one bucket, so each
+  # batch has a homogeneous aspect ratio and is padded per batch instead of to
+  # a square max_dimension canvas.
+  #
+  # inputs.py looks the builder up in INPUT_BUILDER_UTIL_MAP, which holds a
+  # reference to the original dataset_builder.build taken at import time, so
+  # the batching override has to be registered there. read_dataset is looked
+  # up as a module global by dataset_builder.build and is patched in place.
+  from object_detection import inputs
+  from object_detection.builders import dataset_builder
+  read_dataset = dataset_builder.read_dataset
+  build = inputs.INPUT_BUILDER_UTIL_MAP['dataset_build']
+
+  def bucketed_read_dataset(file_read_func, input_files, config,
+                            filename_shard_fn=None):
+    buckets = {}
+    for pattern in input_files:
+      for filename in sorted(tf.io.gfile.glob(pattern)):
+        bucket = os.path.basename(filename).rsplit('-', 3)[0]
+        buckets.setdefault(bucket, []).append(filename)
+    # Evaluation reads every record once, without bucketing.
+    if len(buckets) <= 1 or not config.shuffle:
+      return read_dataset(file_read_func, input_files, config,
+                          filename_shard_fn)
+    datasets = [
+        read_dataset(file_read_func, files, config, filename_shard_fn).batch(
+            batch_size, drop_remainder=True) for files in buckets.values()
+    ]
+    total = sum(len(files) for files in buckets.values())
+    weights = [len(files) / total for files in buckets.values()]
+    return tf.data.Dataset.sample_from_datasets(datasets, weights).unbatch()
+
+  def bucketed_build(input_reader_config, batch_size=None, **kwargs):
+    # Images keep their own size (pad_to_max_dimension is off), so the batch is
+    # padded to the largest image it contains instead of using .batch().
+    if not batch_size or not input_reader_config.shuffle:
+      return build(input_reader_config, batch_size=batch_size, **kwargs)
+    dataset = build(input_reader_config, batch_size=None, **kwargs)
+    dataset = dataset.padded_batch(batch_size, drop_remainder=True)
+    return dataset.prefetch(input_reader_config.num_prefetch_batches)
+
+  dataset_builder.read_dataset = bucketed_read_dataset
+  inputs.INPUT_BUILDER_UTIL_MAP['dataset_build'] = bucketed_build
+
+
 def main(unused_argv):
   flags.mark_flag_as_required('model_dir')
   flags.mark_flag_as_required('pipeline_config_path')
   tf.config.set_soft_device_placement(True)
+  if FLAGS.intra_op_threads:
+    tf.config.threading.set_intra_op_parallelism_threads(FLAGS.intra_op_threads)
+  if FLAGS.inter_op_threads:
+    tf.config.threading.set_inter_op_parallelism_threads(FLAGS.inter_op_threads)
+  if FLAGS.record_compression:
+    use_record_compression(FLAGS.record_compression)
+  if FLAGS.bucket_batch_size:
+    use_bucketed_batches(FLAGS.bucket_batch_size)
 
   if FLAGS.checkpoint_dir:
     model_lib_v2.eval_continuously(
@@ -86,7 +178,7 @@ def main(unused_argv):
         sample_1_of_n_eval_on_train_examples=(
             FLAGS.sample_1_of_n_eval_on_train_examples),
         checkpoint_dir=FLAGS.checkpoint_dir,
-        wait_interval=300, timeout=FLAGS.eval_timeout)
+        wait_interval=FLAGS.eval_wait_interval, timeout=FLAGS.eval_timeout)
   else:
     if FLAGS.use_tpu:
       # TPU is automatically inferred if tpu_name is None and
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 測試以專案根目錄為工作目錄匯入 modules/ 與 script/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
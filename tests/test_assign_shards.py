@@ -0,0 +1,26 @@
+import random
+from modules.recordManifest import assign_shards
+
+
+def sources(target_dir, names):
+  return [str(target_dir / name) for name in names]
+
+def test_assign_shards_is_deterministic(tmp_path):
+  names = [f'{folder}/{n:03d}.json' for folder in ('a', 'b', 'c') for n in range(40)]
+  shards = assign_shards(sources(tmp_path, names), str(tmp_path), 4, seed=1)
+  shuffled = list(names)
+  random.Random(0).shuffle(shuffled)
+  assert assign_shards(sources(tmp_path, shuffled), str(tmp_path), 4, seed=1) == shards
+  assert sorted(file for shard in shards for file in shard) == sorted(sources(tmp_path, names))
+  # seed 只改變分片內的順序，不改變檔案所在的分片
+  reseeded = assign_shards(sources(tmp_path, names), str(tmp_path), 4, seed=2)
+  assert [sorted(shard) for shard in reseeded] == [sorted(shard) for shard in shards]
+  assert reseeded != shards
+
+def test_new_file_only_changes_its_own_shard(tmp_path):
+  names = [f'{n:03d}.json' for n in range(100)]
+  before = assign_shards(sources(tmp_path, names), str(tmp_path), 5)
+  after = assign_shards(sources(tmp_path, names + ['new.json']), str(tmp_path), 5)
+  changed = [index for index in range(5) if before[index] != after[index]]
+  assert len(changed) == 1
+  assert str(tmp_path / 'new.json') in after[changed[0]]
@@ -0,0 +1,30 @@
+import numpy as np
+from modules.boxUtil import annotation_boxes, annotation_size, format_report, has_box_errors, invalid_boxes, validation_report
+
+
+def labelme(*corners):
+  return {'imageWidth': 100, 'imageHeight': 100,
+          'shapes': [{'label': 'a', 'points': [list(p1), list(p2)]} for p1, p2 in corners]}
+
+def test_json_boxes_report_inverted_corners():
+  data = labelme(((10, 10), (20, 20)), ((30, 30), (5, 5)), ((1, 1), (1, 9)), ((90, 90), (120, 95)))
+  boxes, labels = annotation_boxes(data, 'json')
+  assert labels == ['a'] * 4
+  assert invalid_boxes(boxes).tolist() == [False, True, True, False]
+  report = validation_report(['a.json'], [boxes], [annotation_size(data, 'json')])
+  assert (report['inverted'], report['zero_area'], report['out_of_bounds']) == (1, 1, 1)
+  assert report['examples']['inverted'] == ['a.json']
+
+def test_voc_boxes_are_used_as_read():
+  data = {'boxes': np.array([[5, 5, 1, 9]], dtype=np.float32), 'labels': ['a'], 'width': 10, 'height': 10}
+  boxes, _ = annotation_boxes(data, 'xml')
+  assert invalid_boxes(boxes).tolist() == [True]
+
+def test_unreadable_files_are_reported_separately():
+  boxes = np.array([[1, 1, 5, 5]], dtype=np.float32)
+  report = validation_report(['a.json', 'b.json'], [boxes, np.zeros((0, 4), dtype=np.float32)], [(10, 10), (0, 0)],
+                             [None, 'JSONDecodeError: Expecting value'])
+  assert (report['boxes'], report['unreadable'], report['unreadable_files']) == (1, 1, ['b.json'])
+  assert report['examples'] == {'unreadable': ['b.json (JSONDecodeError: Expecting value)']}
+  assert 'unreadable 1' in format_report(report)
+  assert not has_box_errors(report)
@@ -0,0 +1,57 @@
+import importlib.util
+from pathlib import Path
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+pytest.importorskip('object_detection')
+from object_detection import inputs  # noqa: E402
+from object_detection.builders import dataset_builder  # noqa: E402
+from object_detection.protos import input_reader_pb2  # noqa: E402
+
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'script' / 'model_main_tf2.py'
+
+@pytest.fixture(scope='module')
+def model_main():
+  spec = importlib.util.spec_from_file_location('model_main_tf2', SCRIPT)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+def image_example(height, width):
+  encoded = tf.io.encode_jpeg(tf.zeros([height, width, 3], tf.uint8)).numpy()
+  feature = {
+    'image/encoded': tf.train.Feature(bytes_list=tf.train.BytesList(value=[encoded])),
+    'image/format': tf.train.Feature(bytes_list=tf.train.BytesList(value=[b'jpeg'])),
+    'image/height': tf.train.Feature(int64_list=tf.train.Int64List(value=[height])),
+    'image/width': tf.train.Feature(int64_list=tf.train.Int64List(value=[width])),
+    'image/object/bbox/xmin': tf.train.Feature(float_list=tf.train.FloatList(value=[0.1])),
+    'image/object/bbox/xmax': tf.train.Feature(float_list=tf.train.FloatList(value=[0.5])),
+    'image/object/bbox/ymin': tf.train.Feature(float_list=tf.train.FloatList(value=[0.1])),
+    'image/object/bbox/ymax': tf.train.Feature(float_list=tf.train.FloatList(value=[0.5])),
+    'image/object/class/label': tf.train.Feature(int64_list=tf.train.Int64List(value=[1])),
+  }
+  return tf.train.Example(features=tf.train.Features(feature=feature)).SerializeToString()
+
+def write_bucket(directory, bucket, sizes):
+  with tf.io.TFRecordWriter(str(directory / f'train_{bucket}-00000-of-00001.record')) as writer:
+    for height, width in sizes:
+      writer.write(image_example(height, width))
+
+def test_bucketed_batch_pads_differently_sized_images(model_main, tmp_path, monkeypatch):
+  # 同一組內的影像大小仍不同，批次必須補到批次內最大的影像
+  write_bucket(tmp_path, 'landscape', [(30, 40), (30, 50)])
+  write_bucket(tmp_path, 'portrait', [(40, 30), (50, 30)])
+  monkeypatch.setitem(inputs.INPUT_BUILDER_UTIL_MAP, 'dataset_build', inputs.INPUT_BUILDER_UTIL_MAP['dataset_build'])
+  monkeypatch.setattr(dataset_builder, 'read_dataset', dataset_builder.read_dataset)
+  model_main.use_bucketed_batches(2)
+
+  config = input_reader_pb2.InputReader()
+  config.tf_record_input_reader.input_path.append(str(tmp_path / 'train_*-?????-of-?????.record'))
+  config.shuffle = True
+  config.num_readers = 1
+  dataset = inputs.INPUT_BUILDER_UTIL_MAP['dataset_build'](config, batch_size=2)
+
+  for batch in dataset.take(4):
+    image_shape = tuple(batch['image'].shape[:3])
+    assert image_shape in {(2, 30, 50), (2, 50, 30)}
@@ -0,0 +1,68 @@
+import json
+import pytest
+from modules import cocoReader
+from modules.cocoReader import coco_index, coco_sources, load_coco_index, read_coco
+
+
+COCO = {
+  'images': [{'id': 2, 'file_name': 'b.jpg', 'width': 50, 'height': 40},
+             {'id': 1, 'file_name': 'a.jpg', 'width': 100, 'height': 80}],
+  'annotations': [{'image_id': 1, 'category_id': 3, 'bbox': [10, 20, 30, 40]},
+                  {'image_id': 2, 'category_id': 3, 'bbox': [0, 0, 5, 5]},
+                  {'image_id': 1, 'category_id': 7, 'bbox': [1, 2, 3, 4]}],
+  'categories': [{'id': 7, 'name': 'dog'}, {'id': 3, 'name': 'cat'}],
+}
+
+@pytest.fixture(params=['ijson', 'json'])
+def annotation_file(request, tmp_path, monkeypatch):
+  if request.param == 'ijson':
+    pytest.importorskip('ijson')
+  else:
+    monkeypatch.setattr(cocoReader, 'ijson', None)
+  monkeypatch.setattr(cocoReader, 'CACHE_DIR', tmp_path / 'cache')
+  load_coco_index.cache_clear()
+  dataset = tmp_path / 'dataset'
+  dataset.mkdir()
+  path = dataset / 'instances.json'
+  path.write_text(json.dumps(COCO))
+  yield str(path)
+  load_coco_index.cache_clear()
+
+def test_read_coco_groups_annotations_by_image(annotation_file):
+  assert coco_sources(annotation_file) == [f'{annotation_file}#1', f'{annotation_file}#2']
+  data = read_coco(f'{annotation_file}#1')
+  assert (data['filename'], data['width'], data['height']) == ('a.jpg', 100, 80)
+  assert data['labels'] == ['cat', 'dog']
+  assert data['boxes'].tolist() == [[10, 20, 40, 60], [1, 2, 4, 6]]
+
+def test_index_cache_stays_out_of_the_dataset(annotation_file, tmp_path, monkeypatch):
+  coco_index(annotation_file)
+  assert [path.name for path in (tmp_path / 'dataset').iterdir()] == ['instances.json']
+  assert len(list((tmp_path / 'cache').glob('*.npz'))) == 1
+
+  # 新的進程由快取載入，不再解析標註檔
+  load_coco_index.cache_clear()
+  monkeypatch.setattr(cocoReader, 'build_coco_index', lambda json_path: pytest.fail('index rebuilt'))
+  assert read_coco(f'{annotation_file}#2')['labels'] == ['cat']
+
+def test_annotation_file_is_parsed_once(annotation_file, monkeypatch):
+  passes = []
+  if cocoReader.ijson is None:
+    original = json.load
+    monkeypatch.setattr(cocoReader.json, 'load', lambda fid: passes.append(1) or original(fid))
+  else:
+    original = cocoReader.ijson.parse
+    monkeypatch.setattr(cocoReader.ijson, 'parse', lambda *args, **kwargs: passes.append(1) or original(*args, **kwargs))
+  coco_index(annotation_file)
+  assert len(passes) == 1
+
+def test_sections_in_any_order_with_nested_objects(tmp_path, monkeypatch):
+  monkeypatch.setattr(cocoReader, 'CACHE_DIR', tmp_path / 'cache')
+  load_coco_index.cache_clear()
+  path = tmp_path / 'instances.json'
+  annotations = [{**annotation, 'segmentation': {'counts': [1, 2], 'size': [8, 8]}} for annotation in COCO['annotations']]
+  path.write_text(json.dumps({'categories': COCO['categories'], 'info': {'images': []},
+                              'annotations': annotations, 'images': COCO['images']}))
+  assert read_coco(f'{path}#1')['labels'] == ['cat', 'dog']
+  assert read_coco(f'{path}#2')['boxes'].tolist() == [[0, 0, 5, 5]]
+  load_coco_index.cache_clear()
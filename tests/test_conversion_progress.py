@@ -0,0 +1,11 @@
+from modules.conversionProgress import ConversionProgress, format_progress
+
+
+def test_reused_and_resumed_files_are_not_skipped():
+  progress = ConversionProgress('train', 10, reused=90)
+  progress.resume(4, skipped=1)
+  progress.update(100)
+  progress.skip()
+  event = progress.event(finished=True)
+  assert (event['total'], event['done'], event['reused'], event['resumed'], event['skipped']) == (6, 1, 90, 3, 2)
+  assert format_progress(event).endswith('reused 90, resumed 3, skipped 2')
@@ -0,0 +1,21 @@
+from modules import fileScan
+from modules.fileScan import PAIRED_IMAGES, find_image, scan_dataset, use_pairs
+
+
+def test_pairs_are_replaced_per_listing(tmp_path, monkeypatch):
+  monkeypatch.setattr(fileScan, 'CACHE_DIR', tmp_path / 'cache')
+  for name in ('a.json', 'a.png', 'a.jpg', 'b.json'):
+    (tmp_path / 'data' / name).parent.mkdir(exist_ok=True)
+    (tmp_path / 'data' / name).write_bytes(b'')
+  pairs, unpaired = scan_dataset(str(tmp_path / 'data'), 'json')
+  assert pairs == [(str(tmp_path / 'data' / 'a.json'), str(tmp_path / 'data' / 'a.jpg'))]
+  assert unpaired == [str(tmp_path / 'data' / 'b.json')]
+
+  use_pairs(pairs)
+  assert find_image(str(tmp_path / 'data' / 'a.json')) == str(tmp_path / 'data' / 'a.jpg')
+  # 影像移動後重新列出，不會查到舊的配對
+  (tmp_path / 'data' / 'a.jpg').unlink()
+  use_pairs(scan_dataset(str(tmp_path / 'data'), 'json')[0])
+  assert find_image(str(tmp_path / 'data' / 'a.json')) == str(tmp_path / 'data' / 'a.png')
+  use_pairs([])
+  assert not PAIRED_IMAGES
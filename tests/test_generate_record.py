@@ -0,0 +1,41 @@
+import json
+import pytest
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('object_detection')
+from PIL import Image  # noqa: E402
+from modules.genRecord import generate_record, prepare_label_map, shard_pattern  # noqa: E402
+from modules.recordIndex import DatasetIndex  # noqa: E402
+
+
+def labelme_dataset(directory, count, broken=()):
+  directory.mkdir(parents=True)
+  for n in range(count):
+    Image.new('RGB', (64, 48)).save(directory / f'{n}.jpg')
+    text = json.dumps({'imagePath': f'{n}.jpg', 'imageWidth': 64, 'imageHeight': 48,
+                       'shapes': [{'label': 'cat' if n % 2 else 'dog', 'points': [[5, 5], [30, 30]]}]})
+    (directory / f'{n}.json').write_text(text[:20] if n in broken else text)
+  return directory
+
+def convert(target_dir, save_dir, **kwargs):
+  return [message for message in generate_record(str(target_dir), [''], str(save_dir), format='json', num_workers=1, **kwargs)]
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+
+def test_unreadable_annotation_is_left_out(tmp_path):
+  dataset = labelme_dataset(tmp_path / 'train', 4, broken={2})
+  label_map, _, report = prepare_label_map([str(dataset)], 'json', num_workers=1)
+  assert dict(label_map) == {'cat': 1, 'dog': 2}
+  assert report['unreadable_files'] == [str(dataset / '2.json')]
+
+  messages = convert(dataset, tmp_path / 'records', label_map_dict=label_map, exclude_files=report['unreadable_files'])
+  assert 'train: left out 1 unreadable annotation files' in messages
+  assert len(DatasetIndex.from_pattern(str(tmp_path / 'records' / shard_pattern('train')))) == 3
+
+def test_incremental_rerun_reports_reused_files(tmp_path):
+  dataset = labelme_dataset(tmp_path / 'train', 3)
+  convert(dataset, tmp_path / 'records')
+  events = [message for message in convert(dataset, tmp_path / 'records') if isinstance(message, dict)]
+  assert (events[-1]['done'], events[-1]['reused'], events[-1]['skipped']) == (0, 3, 0)
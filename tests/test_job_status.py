@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import threading
+import pytest
+
+pytest.importorskip('psutil')
+from modules import jobRunner  # noqa: E402
+from modules.jobManager import (EXIT_FILE, LOG_FILE, cancel_job, create_job, job_status, load_job,  # noqa: E402
+                                update_job)
+
+
+@pytest.fixture(autouse=True)
+def project_root(tmp_path, monkeypatch):
+  # 工作資料夾建立在 projects/ 之下，以暫存目錄當作專案根目錄
+  monkeypatch.chdir(tmp_path)
+
+def dead_pid():
+  process = subprocess.Popen([sys.executable, '-c', 'pass'])
+  process.wait()
+  return process.pid
+
+def new_job(command=None):
+  return create_job('demo', 'train', command or [sys.executable, '-c', 'print("hello")'])
+
+def test_queued_then_pending():
+  directory = new_job()
+  assert job_status(directory) == 'queued'
+  update_job(directory, status='pending')
+  assert job_status(directory) == 'pending'
+
+def test_running_paused_and_lost():
+  directory = new_job()
+  update_job(directory, status='running', runner_pid=dead_pid())
+  assert job_status(directory) == 'lost'
+  update_job(directory, runner_pid=os.getpid())
+  assert job_status(directory) == 'running'
+  update_job(directory, paused=True)
+  assert job_status(directory) == 'paused'
+
+def test_exit_code_decides_finished_failed_cancelled():
+  directory = new_job()
+  update_job(directory, status='running', runner_pid=dead_pid())
+  (directory / EXIT_FILE).write_text('0')
+  assert job_status(directory) == 'finished'
+  (directory / EXIT_FILE).write_text('1')
+  assert job_status(directory) == 'failed'
+  update_job(directory, cancelled=True)
+  assert job_status(directory) == 'cancelled'
+
+def test_cancel_queued_job():
+  directory = new_job()
+  cancel_job(directory)
+  assert job_status(directory) == 'cancelled'
+  assert (directory / EXIT_FILE).exists()
+
+def test_runner_runs_command_and_records_result():
+  directory = new_job()
+  assert jobRunner.run(directory) == 0
+  assert job_status(directory) == 'finished'
+  assert 'hello' in (directory / LOG_FILE).read_text()
+
+def test_runner_skips_command_cancelled_before_start(tmp_path):
+  marker = tmp_path / 'ran'
+  directory = new_job([sys.executable, '-c', f'open({str(marker)!r}, "w").close()'])
+  update_job(directory, status='pending', cancelled=True)
+  jobRunner.run(directory)
+  assert not marker.exists()
+  assert job_status(directory) == 'cancelled'
+
+def test_concurrent_updates_keep_every_field():
+  directory = new_job()
+
+  def writer(name):
+    for index in range(50):
+      update_job(directory, **{name: index})
+
+  threads = [threading.Thread(target=writer, args=(f'field{index}',)) for index in range(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  job = load_job(directory)
+  assert all(job[f'field{index}'] == 49 for index in range(4))
@@ -0,0 +1,91 @@
+import os
+import struct
+from pathlib import Path
+import numpy as np
+import pytest
+from modules import recordJournal
+from modules.datasetStats import example_columns
+from modules.recordIndex import RECORD_HEADER_BYTES, RECORD_OVERHEAD_BYTES, RecordIndex, write_index
+from modules.recordJournal import RecordJournal, ResumableRecordWriter, journal_path, segment_path
+
+
+class FramedWriter:
+  # 與 tf.io.TFRecordWriter 相同的框架：uint64 長度 + 長度 CRC + 資料 + 資料 CRC，CRC 以固定值代替
+  def __init__(self, path, compression=None):
+    self.fid = open(path, 'wb')
+
+  def write(self, data):
+    self.fid.write(struct.pack('<Q', len(data)) + b'hcrc' + data + b'dcrc')
+
+  def close(self):
+    self.fid.close()
+
+def read_framed(path):
+  records = []
+  with open(path, 'rb') as fid:
+    while header := fid.read(RECORD_HEADER_BYTES):
+      offset = fid.tell() - RECORD_HEADER_BYTES
+      length = struct.unpack('<Q', header[:8])[0]
+      records.append((offset, fid.read(length)))
+      fid.read(RECORD_OVERHEAD_BYTES - RECORD_HEADER_BYTES)
+  return records
+
+def payload(n):
+  return f'record {n}'.encode() * (n + 1)
+
+def write_records(writer, numbers):
+  for n in numbers:
+    writer.write(payload(n), f'{n}.jpg', example_columns(10, 10, [1] * n, np.ones(n), np.ones(n)))
+
+@pytest.fixture(autouse=True)
+def framed_writer(monkeypatch):
+  monkeypatch.setattr(recordJournal, 'record_writer', FramedWriter)
+
+def test_resume_truncates_uncommitted_segment(tmp_path):
+  path = str(tmp_path / 'train-00000-of-00001.tfrecord')
+  writer = ResumableRecordWriter(path, RecordJournal('key'))
+  write_records(writer, range(3))
+  writer.commit()
+  committed = os.path.getsize(path)
+  # 中斷於附加 segment 的途中：分片尾端留下不完整的紀錄，segment 內的紀錄尚未提交
+  write_records(writer, range(3, 5))
+  writer.writer.close()
+  with open(path, 'ab') as fid:
+    fid.write(Path(segment_path(path)).read_bytes()[:7])
+
+  journal = RecordJournal.load(path, 'key')
+  assert (journal.done, journal.offset, journal.filenames) == (3, committed, ['0.jpg', '1.jpg', '2.jpg'])
+  writer = ResumableRecordWriter(path, journal)
+  assert os.path.getsize(path) == committed
+  write_records(writer, range(journal.done, 5))
+  journal = writer.close()
+  assert not os.path.exists(segment_path(path))
+  assert [data for _, data in read_framed(path)] == [payload(n) for n in range(5)]
+  assert journal.objects == [0, 1, 2, 3, 4]
+
+def test_stale_journal_is_ignored(tmp_path):
+  path = str(tmp_path / 'train.tfrecord')
+  writer = ResumableRecordWriter(path, RecordJournal('key'))
+  write_records(writer, range(2))
+  writer.close()
+  assert RecordJournal.load(path, 'other key').done == 0
+  # 分片比提交的位移短（例如被覆寫）時不可接續
+  os.truncate(path, 5)
+  assert RecordJournal.load(path, 'key').done == 0
+  with open(journal_path(path), 'wb') as fid:
+    fid.write(b'not a journal')
+  assert RecordJournal.load(path, 'key').done == 0
+
+def test_index_offsets_match_record_framing(tmp_path):
+  path = str(tmp_path / 'train.tfrecord')
+  writer = FramedWriter(path)
+  for n in range(6):
+    writer.write(payload(n))
+  writer.close()
+  write_index(path, [len(payload(n)) for n in range(6)], [f'{n}.jpg' for n in range(6)], list(range(6)))
+
+  index = RecordIndex(path)
+  assert len(index) == 6
+  assert index.offset.tolist() == [offset for offset, _ in read_framed(path)]
+  assert int(index.offset[-1] + index.length[-1]) + RECORD_OVERHEAD_BYTES == os.path.getsize(path)
+  assert [index.read(n) for n in range(6)] == [payload(n) for n in range(6)]
@@ -0,0 +1,35 @@
+import os
+from modules.recordIndex import index_path
+from modules.recordManifest import plan_shards
+
+
+SETTINGS = {'format': 'json', 'num_shards': 1}
+
+def sources(directory):
+  return [(name, str(directory / f'{name}.json'), str(directory / f'{name}.jpg')) for name in ('a', 'b')]
+
+def fresh_build(tmp_path):
+  for name in ('a', 'b'):
+    (tmp_path / f'{name}.json').write_text('{}')
+    (tmp_path / f'{name}.jpg').write_bytes(name.encode())
+  shard = str(tmp_path / 'train-00000-of-00001.record')
+  entries, dirty = plan_shards([(shard, sources(tmp_path))], {}, SETTINGS)
+  assert dirty == [0]
+  # 寫入分片與索引檔後的狀態
+  open(shard, 'wb').close()
+  open(index_path(shard), 'wb').close()
+  return shard, {'settings': SETTINGS, 'files': entries}
+
+def test_touch_after_fresh_build_keeps_shard(tmp_path):
+  shard, section = fresh_build(tmp_path)
+  assert all(entry['hash'] for entry in section['files'].values())
+  stat = os.stat(tmp_path / 'a.jpg')
+  os.utime(tmp_path / 'a.jpg', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+  entries, dirty = plan_shards([(shard, sources(tmp_path))], section, SETTINGS)
+  assert dirty == []
+  assert entries['a']['image'] != section['files']['a']['image']
+
+def test_changed_content_rebuilds_shard(tmp_path):
+  shard, section = fresh_build(tmp_path)
+  (tmp_path / 'b.jpg').write_bytes(b'changed')
+  assert plan_shards([(shard, sources(tmp_path))], section, SETTINGS)[1] == [0]
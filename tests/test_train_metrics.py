@@ -0,0 +1,30 @@
+import json
+import os
+from modules.trainMetrics import eval_summary, load_metrics, metrics_file
+
+
+def append(path, records, partial=''):
+  with open(path, 'a', encoding='utf8') as fid:
+    fid.write(''.join(json.dumps(record) + '\n' for record in records) + partial)
+
+def test_load_metrics_parses_only_new_lines(tmp_path):
+  path = tmp_path / 'eval_metrics.jsonl'
+  assert load_metrics(path) == {}
+  append(path, [{'run': 'a', 'step': 100, 'DetectionBoxes_Precision/mAP': 0.25}], partial='{"run": "a", "st')
+  runs = load_metrics(path)
+  assert list(runs['a'].column('step')) == [100]
+  assert metrics_file(str(path.absolute())).offset < os.path.getsize(path)
+
+  # 補完寫到一半的行
+  append(path, [], partial='ep": 200, "DetectionBoxes_Precision/mAP": 0.5}\n')
+  assert list(load_metrics(path)['a'].column('step')) == [100, 200]
+  assert metrics_file(str(path.absolute())).offset == os.path.getsize(path)
+  assert eval_summary(load_metrics(path)) == '評估 step 200: mAP 0.500'
+
+def test_replaced_file_is_read_again(tmp_path):
+  path = tmp_path / 'training_metrics.jsonl'
+  append(path, [{'run': 'a', 'step': step} for step in (100, 200, 300)])
+  assert len(load_metrics(path)['a'].column('step')) == 3
+  path.unlink()
+  append(path, [{'run': 'b', 'step': 100}])
+  assert list(load_metrics(path)) == ['b']
@@ -0,0 +1,19 @@
+import json
+from modules.trainTuning import load_tuning, save_tuning, scale_tuning
+
+
+def test_scale_tuning_fits_thread_counts_to_cores():
+  tuning = {'intra_op_threads': 64, 'inter_op_threads': 4, 'omp_num_threads': 32, 'num_readers': 16}
+  scaled = scale_tuning(tuning, tuned_cpus=64, cores=8)
+  assert scaled == {'intra_op_threads': 8, 'inter_op_threads': 4, 'omp_num_threads': 4, 'num_readers': 16}
+  assert scale_tuning(tuning, tuned_cpus=64, cores=2)['inter_op_threads'] == 2
+  assert scale_tuning(tuning, tuned_cpus=64, cores=64) == tuning
+
+def test_save_tuning_keeps_other_settings(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  (tmp_path / 'projects' / 'demo').mkdir(parents=True)
+  (tmp_path / 'projects' / 'demo' / 'setting.json').write_text(json.dumps({'required': {'Model': 'm'}}))
+  save_tuning('demo', {'intra_op_threads': 16}, 1.5, 16)
+  settings = json.loads((tmp_path / 'projects' / 'demo' / 'setting.json').read_text())
+  assert settings['required'] == {'Model': 'm'}
+  assert load_tuning('demo', cores=4) == {'intra_op_threads': 4}
@@ -3,6 +3,9 @@ import json
 import requests
 import tarfile
 import gradio as gr
+from modules.datasetStats import load_statistics, format_statistics
+from modules.trainMetrics import checkpoint_frames
+from modules.jobManager import list_jobs, job_dir, job_status, cancel_job, pause_job, resume_job
 
 models = [
     "faster_rcnn_resnet50_v1_1024x1024_coco17_tpu-8",
@@ -48,8 +51,10 @@ def get_models():
 def save_project_settings(project_name, dataset_format, training_classes, batch_size, num_steps, checkpoint_every_n, model, task_name):
     project_path = os.path.join("projects", project_name)
     settings_file = os.path.join(project_path, "setting.json")
-    
-    settings = {
+
+    # 保留其他設定，例如自動調校的結果
+    settings = load_project_settings(project_name) or {}
+    settings.update({
         "required": {
             "Model": model,
             "format": dataset_format,
@@ -61,7 +66,7 @@ def save_project_settings(project_name, dataset_format, training_classes, batch_
             "num_steps": num_steps,
             "checkpoint_every_n": checkpoint_every_n
         }
-    }
+    })
     
     with open(settings_file, "w") as f:
         json.dump(settings, f, indent=2)
@@ -168,4 +173,37 @@ def process_string_list(input_text):
     string_list = input_text.split(',')
     # 在這裡處理字串列表
     processed_list = [s.strip() for s in string_list]
-    return processed_list
\ No newline at end of file
+    return processed_list
+
+def get_dataset_statistics(project_name, task_name):
+    # 讀取轉換時產生的統計快取，不需重新掃描資料集
+    if not project_name or not task_name:
+        return ""
+
+    save_dir = os.path.join("projects", project_name, "TFRecord", task_name)
+    sections = []
+    for record_type in ("train", "test"):
+        stats = load_statistics(save_dir, record_type)
+        if stats is not None:
+            sections.append(format_statistics(stats, record_type))
+
+    return "\n\n".join(sections) if sections else "尚未轉換資料，沒有統計資訊。"
+
+def get_training_metrics(project_name, task_name):
+    # 讀取任務的 metrics 檔，顯示最近一次訓練的 loss、歷次訓練的速度與評估的 mAP
+    if not project_name or not task_name:
+        return checkpoint_frames("")
+    return checkpoint_frames(os.path.join("projects", project_name, "Checkpoint", task_name))
+
+def get_job_choices(project_name):
+    # 專案的背景工作，由新到舊，預設選擇最新的工作
+    job_ids = [job["id"] for job in list_jobs(project_name)]
+    return gr.update(choices=job_ids, value=job_ids[0] if job_ids else None)
+
+def control_job(project_name, job_id, action):
+    # action: cancel / pause / resume
+    if not project_name or not job_id:
+        return "請先選擇背景工作！"
+    directory = job_dir(project_name, job_id)
+    {"cancel": cancel_job, "pause": pause_job, "resume": resume_job}[action](directory)
+    return f"工作 {job_id} 狀態: {job_status(directory)}"
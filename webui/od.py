@@ -1,115 +1,327 @@
-from modules.genRecord import generate_record
+from modules.genRecord import (generate_record, record_input_path, record_compression, records_preshuffled,
+                               records_bucketed, prepare_label_map)
+from modules.conversionProgress import format_progress
+from modules.boxUtil import format_report, has_box_errors
+from modules.imageUtil import resizer_max_side
+from modules.jobManager import follow_job, job_dir, cancel_job
+from modules.jobScheduler import scheduler, submit_job
+from modules.tfWorker import python_command
+from modules.trainMetrics import checkpoint_frames, eval_metrics_path, eval_summary, load_metrics, metrics_path
+import os
+import json
 import subprocess
 import shutil
-from object_detection.utils import config_util, label_map_util
+import time
+from modules.trainTuning import load_tuning, tuning_args, tuning_env, tuning_overrides
+from modules.pipelineConfig import label_map_dict, merged_pipeline, model_config, model_type, pipeline_text, save_pipeline
 
-def export(project_name, task_name):
-    try:
-        process = subprocess.Popen(
-            ['python', 'script/exporter_main_v2.py',
-             '--trained_checkpoint_dir', f'./projects/{project_name}/Checkpoint/{task_name}',
-             '--pipeline_config_path', f'./projects/{project_name}/Models/{task_name}/pipeline.config',
-             '--output_directory', f'./projects/{project_name}/Models/{task_name}'
-            ],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
+# 轉換時已洗牌的資料只需小的 shuffle buffer，預設 2048 張影像的 buffer 佔用大量記憶體
+PRESHUFFLED_BUFFER_SIZE = 256
 
-        # Yield output while the command is running
-        while True:
-            output = process.stdout.readline()
-            error_output = process.stderr.readline()
-            if output:
-                yield "輸出: " + output.strip() + "\n"
-            if error_output:
-                yield "錯誤訊息: " + error_output.strip() + "\n"
+# 輸出模型只需要少量核心
+EXPORT_CORES = 2
+# OD_WARM_WORKER=1 時由已匯入 TensorFlow 的 tfWorker fork 執行，否則（預設）為一般啟動
+WARM_PYTHON = python_command()
+# 評估程序的核心數、nice 值、兩次評估的最短間隔與等待新 checkpoint 的逾時（秒）
+EVAL_CORES = 2
+EVAL_NICE = 10
+EVAL_WAIT_INTERVAL = 60
+EVAL_TIMEOUT = 3600
+# 自動調校每組設定的訓練步數，訓練程式每 100 步輸出一次速度
+TUNE_BURST_STEPS = 300
 
-            if output == '' and error_output == '' and process.poll() is not None:
-                break 
+def follow_output(project_name, job_id):
+    # 追蹤背景工作的記錄檔，產生 (畫面文字, 狀態)；關閉頁面不影響工作，之後可由「背景工作」重新連線
+    for text, status, _ in follow_job(job_dir(project_name, job_id)):
+        yield f"工作 {job_id} [{status}]\n" + text, status
 
+def export(project_name, task_name):
+    try:
         shutil.copy(
             f'./projects/{project_name}/TFRecord/{task_name}/label_map.pbtxt',
             f'./projects/{project_name}/Models/{task_name}/label_map.pbtxt'
         )
-        yield "模型轉換完成！！\n"
+        job_id = submit_job(project_name, 'export', [
+            *WARM_PYTHON, 'script/exporter_main_v2.py',
+            '--trained_checkpoint_dir', f'./projects/{project_name}/Checkpoint/{task_name}',
+            '--pipeline_config_path', f'./projects/{project_name}/Models/{task_name}/pipeline.config',
+            '--output_directory', f'./projects/{project_name}/Models/{task_name}'
+        ], cores=EXPORT_CORES)
+
+        for text, status in follow_output(project_name, job_id):
+            yield text
+        if status == 'finished':
+            yield text + "模型轉換完成！！\n"
+        else:
+            yield text + "模型轉換失敗！\n"
     except subprocess.CalledProcessError as e:
         yield "模型轉換失敗！\n" + str(e.stderr)
     except Exception as e:
         yield "模型轉換失敗！\n" + str(e)
 
-def train(project_name, task_name, batch_size, num_steps, checkpoint_every_n, reference_model):
+def build_train_config(project_name, task_name, batch_size, num_steps, reference_model, tuning=None):
+    # 回傳 (合併後的 pipeline config, 訓練程式的額外參數)；參考設定與 label map 的解析結果依 mtime 快取
+    # tuning 為執行緒與輸入管線設定，None 時使用專案 setting.json 中的調校結果（以整台機器的核心數調整）
+    reference_config = f'./models/{reference_model}/pipeline.config'
+    label_map = label_map_dict(f'./projects/{project_name}/TFRecord/{task_name}/label_map.pbtxt')
+    model = model_type(reference_config)
+
+    override_dict = {
+        f'model.{model}.num_classes': len(label_map.keys()),
+        'train_config.batch_size': batch_size,
+        'train_config.fine_tune_checkpoint': f'./models/{reference_model}/checkpoint/ckpt-0',
+        'train_config.num_steps': num_steps,
+        'label_map_path': f'./projects/{project_name}/TFRecord/{task_name}/label_map.pbtxt',
+        'train_input_path': record_input_path(f'./projects/{project_name}/TFRecord/{task_name}', 'train'),
+        'eval_input_path': record_input_path(f'./projects/{project_name}/TFRecord/{task_name}', 'test')
+    }
+    if records_preshuffled(f'./projects/{project_name}/TFRecord/{task_name}', 'train'):
+        override_dict['train_input_config.shuffle_buffer_size'] = PRESHUFFLED_BUFFER_SIZE
+    # 依寬高比分組的資料：每個批次取自同一組，只補到批次內最大的影像，不再補成 max_dimension 正方形
+    # 需要兩組以上才會分組讀取，否則保留 pad_to_max_dimension 讓一般的 batch 可以堆疊
+    bucket_args = []
+    image_resizer = model_config(reference_config).image_resizer
+    if (records_bucketed(f'./projects/{project_name}/TFRecord/{task_name}', 'train')
+            and image_resizer.WhichOneof('image_resizer_oneof') == 'keep_aspect_ratio_resizer'):
+        override_dict[f'model.{model}.image_resizer.keep_aspect_ratio_resizer.pad_to_max_dimension'] = False
+        bucket_args = ['--bucket_batch_size', str(int(batch_size))]
+
+    tuning = load_tuning(project_name, len(scheduler.cpus)) if tuning is None else tuning
+    override_dict.update(tuning_overrides(tuning))
+    return merged_pipeline(reference_config, override_dict), bucket_args + tuning_args(tuning)
+
+def preview_config(project_name, task_name, batch_size, num_steps, reference_model):
+    # 不啟動訓練，只顯示合併後的 pipeline.config
+    if not project_name or not task_name or not reference_model:
+        return "請先選擇專案、參考模型並填寫任務名稱！"
     try:
-        # 設定模型參數
-        configs = config_util.get_configs_from_pipeline_file(f'./models/{reference_model}/pipeline.config')
-        label_map = label_map_util.get_label_map_dict(f'./projects/{project_name}/TFRecord/{task_name}/label_map.pbtxt')
-        
-        override_dict = {
-            f'model.{configs["model"].WhichOneof("model")}.num_classes': len(label_map.keys()),
-            'train_config.batch_size': batch_size,
-            'train_config.fine_tune_checkpoint': f'./models/{reference_model}/checkpoint/ckpt-0',
-            'train_config.num_steps': num_steps,
-            'label_map_path': f'./projects/{project_name}/TFRecord/{task_name}/label_map.pbtxt',
-            'train_input_path': f'./projects/{project_name}/TFRecord/{task_name}/train.record',
-            'eval_input_path': f'./projects/{project_name}/TFRecord/{task_name}/test.record'
-        }
-        
-        configs = config_util.merge_external_params_with_configs(configs, kwargs_dict=override_dict)
-        pipeline_config = config_util.create_pipeline_proto_from_configs(configs)
-        config_util.save_pipeline_config(pipeline_config, f'./projects/{project_name}/Models/{task_name}')
-        yield "CONFIG 設定完成！\n"
+        pipeline_config, _ = build_train_config(project_name, task_name, batch_size, num_steps, reference_model)
+        return pipeline_text(pipeline_config)
+    except Exception as e:
+        return "無法產生設定！\n" + str(e)
+
+def train(project_name, task_name, batch_size, num_steps, checkpoint_every_n, reference_model, num_cores=0, eval_sample_n=0):
+    # 回傳 (輸出文字, loss 圖表, 訓練速度圖表, mAP 圖表)，訓練與評估數據由背景工作附加到任務的 metrics 檔
+    checkpoint_dir = f'./projects/{project_name}/Checkpoint/{task_name}'
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    try:
+        # num_cores 為 0 時使用整台機器，其他工作排隊等待；有評估程序時保留它的核心
+        train_cores = int(num_cores) if num_cores else None
+        if eval_sample_n and not train_cores:
+            train_cores = max(1, len(scheduler.cpus) - EVAL_CORES)
+        # 調校結果的執行緒數量依排程器實際分配的核心數調整
+        tuning = load_tuning(project_name, min(train_cores or len(scheduler.cpus), len(scheduler.cpus)))
+
+        # 設定模型參數，內容未變時不重寫 pipeline.config
+        pipeline_config, train_args = build_train_config(project_name, task_name, batch_size, num_steps, reference_model,
+                                                         tuning=tuning)
+        save_pipeline(pipeline_config, f'./projects/{project_name}/Models/{task_name}')
+        yield ("CONFIG 設定完成！\n", *checkpoint_frames(checkpoint_dir))
         
-        # 執行訓練程序
-        process = subprocess.Popen(
-            ['python', 'script/model_main_tf2.py',
-             '--pipeline_config_path', f'./projects/{project_name}/Models/{task_name}/pipeline.config',
-             '--model_dir', f'./projects/{project_name}/Checkpoint/{task_name}',
-             '--checkpoint_every_n', str(checkpoint_every_n)
-            ],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
+        # input_reader 沒有壓縮欄位，壓縮格式以參數傳給訓練程式
+        compression = record_compression(f'./projects/{project_name}/TFRecord/{task_name}', 'train')
 
-        # 實時輸出訓練進度和錯誤
-        while True:
-            output = process.stdout.readline()
-            error_output = process.stderr.readline()
-            if output:
-                yield "訓練輸出: " + output.strip() + "\n"
-            if error_output:
-                yield "錯誤訊息: " + error_output.strip() + "\n"
+        # 以背景工作執行訓練程序，訓練數據由工作執行器解析並寫入 metrics 檔
+        job_id = submit_job(project_name, 'train', [
+            *WARM_PYTHON, 'script/model_main_tf2.py',
+            '--pipeline_config_path', f'./projects/{project_name}/Models/{task_name}/pipeline.config',
+            '--model_dir', checkpoint_dir,
+            '--checkpoint_every_n', str(checkpoint_every_n),
+            '--record_compression', compression,
+            *train_args
+        ], metrics_path=metrics_path(checkpoint_dir), cores=train_cores, env=tuning_env(tuning))
+        eval_job_id = submit_eval(project_name, task_name, eval_sample_n, compression) if eval_sample_n else None
 
-            if output == '' and error_output == '' and process.poll() is not None:
-                break
+        for text, status in follow_output(project_name, job_id):
+            frames = checkpoint_frames(checkpoint_dir)
+            summary = eval_summary(load_metrics(eval_metrics_path(checkpoint_dir)))
+            yield ((summary + "\n" if summary else "") + text, *frames)
 
-        if process.returncode == 0:
-            yield "模型訓練完成！\n"
+        if status == 'finished':
+            yield (text + "模型訓練完成！\n", *checkpoint_frames(checkpoint_dir))
         else:
-            yield "模型訓練可能有錯誤，請檢查！\n"
+            # 訓練沒有完成時評估程序等不到最後的 checkpoint，一併取消
+            if eval_job_id:
+                cancel_job(job_dir(project_name, eval_job_id))
+            yield (text + "模型訓練可能有錯誤，請檢查！\n", *checkpoint_frames(checkpoint_dir))
     except subprocess.CalledProcessError as e:
-        yield "模型訓練失敗！\n" + str(e.stderr)
+        yield ("模型訓練失敗！\n" + str(e.stderr), *checkpoint_frames(checkpoint_dir))
     except Exception as e:
-        yield "模型訓練失敗！\n" + str(e)
+        yield ("模型訓練失敗！\n" + str(e), *checkpoint_frames(checkpoint_dir))
+
+def submit_eval(project_name, task_name, eval_sample_n, compression):
+    # 與訓練同時執行的評估程序：每出現新的 checkpoint 以 1/N 的測試資料計算 mAP
+    # 只用少量核心、降低優先權且不使用 GPU，不影響訓練速度；評估到最後一步的 checkpoint 後自行結束
+    checkpoint_dir = f'./projects/{project_name}/Checkpoint/{task_name}'
+    return submit_job(project_name, 'eval', [
+        *WARM_PYTHON, 'script/model_main_tf2.py',
+        '--pipeline_config_path', f'./projects/{project_name}/Models/{task_name}/pipeline.config',
+        '--model_dir', checkpoint_dir,
+        '--checkpoint_dir', checkpoint_dir,
+        '--sample_1_of_n_eval_examples', str(int(eval_sample_n)),
+        '--record_compression', compression,
+        '--eval_wait_interval', str(EVAL_WAIT_INTERVAL),
+        '--eval_timeout', str(EVAL_TIMEOUT)
+    ], metrics_path=eval_metrics_path(checkpoint_dir), cores=EVAL_CORES, nice=EVAL_NICE,
+        env={'CUDA_VISIBLE_DEVICES': '-1'})
+
+# 轉換進度更新到 Gradio 的最短間隔（秒）
+PROGRESS_INTERVAL = 0.5
 
-def getTFRecord(project_name, dataset_format, task_name):
+def stream_conversion(messages, summary):
+    # 進度事件依 PROGRESS_INTERVAL 限速輸出，文字訊息與完成事件保留在 summary 中
+    last_update = 0.0
+    for message in messages:
+        if isinstance(message, dict):
+            if message['finished']:
+                summary.append(format_progress(message))
+                yield "\n".join(summary) + "\n"
+                continue
+            now = time.monotonic()
+            if now - last_update < PROGRESS_INTERVAL:
+                continue
+            last_update = now
+            yield "\n".join(summary + [format_progress(message)]) + "\n"
+        else:
+            summary.append(message)
+            yield "\n".join(summary) + "\n"
+
+def get_resize_setting(reference_model, jpeg_quality):
+    # 依參考模型 image_resizer 的輸入尺寸決定縮圖長邊
+    max_side = resizer_max_side(model_config(f'./models/{reference_model}/pipeline.config').image_resizer)
+    return [max_side, int(jpeg_quality)] if max_side else None
+
+def getTFRecord(project_name, dataset_format, task_name, num_workers=None, num_shards=None, shard_size_mb=200, training_classes="",
+                drop_invalid_boxes=False, reference_model=None, resize_images=False, jpeg_quality=90, memory_budget_mb=1024,
+                compression="NONE", aspect_buckets=False):
+    # 以背景工作執行 script/convert_dataset.py，參數以 JSON 傳遞
     try:
+        settings = dict(
+            project_name=project_name, dataset_format=dataset_format, task_name=task_name, num_workers=num_workers,
+            num_shards=num_shards, shard_size_mb=shard_size_mb, training_classes=training_classes,
+            drop_invalid_boxes=drop_invalid_boxes, reference_model=reference_model, resize_images=resize_images,
+            jpeg_quality=jpeg_quality, memory_budget_mb=memory_budget_mb, compression=compression,
+            aspect_buckets=aspect_buckets
+        )
+        # 轉換的核心數與轉換進程數相同
+        job_id = submit_job(project_name, 'convert', [
+            'python', 'script/convert_dataset.py', '--settings', json.dumps(settings, ensure_ascii=False)
+        ], cores=int(num_workers) if num_workers else None)
+
+        for text, status in follow_output(project_name, job_id):
+            yield text
+        if status != 'finished':
+            yield text + "資料轉換失敗！\n"
+    except Exception as e:
+        yield "資料轉換失敗！\n" + str(e)
+
+def convert_dataset(project_name, dataset_format, task_name, num_workers=None, num_shards=None, shard_size_mb=200, training_classes="",
+                    drop_invalid_boxes=False, reference_model=None, resize_images=False, jpeg_quality=90, memory_budget_mb=1024,
+                    compression="NONE", aspect_buckets=False):
+    try:
+        num_workers = int(num_workers) if num_workers else None
+        num_shards = int(num_shards) if num_shards else None
+        shard_size_mb = float(shard_size_mb) if shard_size_mb else 200
+        memory_budget_mb = float(memory_budget_mb) if memory_budget_mb else 1024
+        compression = None if compression in (None, "", "NONE") else compression
+        training_classes = [c.strip() for c in training_classes.split(',') if c.strip()] if training_classes else None
+        summary = []
+
+        # 先掃描訓練與測試資料集的類別，兩者共用同一份固定的 label map
+        label_map, ignored, report = prepare_label_map(
+            [f'./datasets/{project_name}/train', f'./datasets/{project_name}/test'],
+            dataset_format, num_workers, training_classes
+        )
+        summary.append(f"類別: {', '.join(f'{name}={id}' for name, id in label_map.items())}")
+        if ignored:
+            summary.append(f"未列入訓練類別而略過: {', '.join(ignored)}")
+        summary.append(format_report(report))
+        if has_box_errors(report) and not drop_invalid_boxes:
+            yield "\n".join(summary) + "\n標註框有誤，已停止轉換。請修正標註或勾選略過無效標註框。\n"
+            return
+        resize = None
+        if resize_images:
+            if not reference_model:
+                yield "\n".join(summary) + "\n縮小影像需要先選擇參考模型！\n"
+                return
+            resize = get_resize_setting(reference_model, jpeg_quality)
+            summary.append(f"影像長邊縮至 {resize[0]} px，JPEG 品質 {resize[1]}" if resize else "無法由參考模型推算輸入尺寸，保留原始影像")
+        yield "\n".join(summary) + "\n"
+
         # 處理訓練資料集
-        for message in generate_record(
+        for message in stream_conversion(generate_record(
             target_dir=f'./datasets/{project_name}/train', 
             data_folders=[''],  # [''] mean selected all
             save_dir=f'./projects/{project_name}/TFRecord/{task_name}',
+            label_map_dict=label_map,
             format=dataset_format,
-            is_train=True
-        ):
+            is_train=True,
+            num_workers=num_workers,
+            num_shards=num_shards,
+            shard_size_mb=shard_size_mb,
+            resize=resize,
+            memory_budget_mb=memory_budget_mb,
+            compression=compression,
+            aspect_buckets=aspect_buckets,
+            drop_invalid_boxes=drop_invalid_boxes,
+            exclude_files=report['unreadable_files']
+        ), summary):
             yield message
 
         # 處理測試資料集
-        for message in generate_record(
+        for message in stream_conversion(generate_record(
             target_dir=f'./datasets/{project_name}/test', 
             data_folders=[''],  # [''] mean selected all
             save_dir=f'./projects/{project_name}/TFRecord/{task_name}',
+            label_map_dict=label_map,
             format=dataset_format,
-            is_train=False
-        ):
+            is_train=False,
+            num_workers=num_workers,
+            num_shards=num_shards,
+            shard_size_mb=shard_size_mb,
+            resize=resize,
+            memory_budget_mb=memory_budget_mb,
+            compression=compression,
+            aspect_buckets=aspect_buckets,
+            drop_invalid_boxes=drop_invalid_boxes,
+            exclude_files=report['unreadable_files']
+        ), summary):
             yield message
 
-        yield "資料轉換完成\n"
+        yield "\n".join(summary) + "\n資料轉換完成\n"
     except subprocess.CalledProcessError as e:
         yield "模型訓練失敗！\n" + e.stderr
+    except Exception as e:
+        yield "資料轉換失敗！\n" + str(e)
+
+def attach_job(project_name, job_id):
+    # 重新連線到背景工作，只讀取記錄檔最後的部分再繼續追蹤
+    if not project_name or not job_id:
+        yield "請先選擇背景工作！\n"
+        return
+    for text, status in follow_output(project_name, job_id):
+        yield text
+
+def autotune(project_name, task_name, batch_size, reference_model, burst_steps=TUNE_BURST_STEPS):
+    # 以背景工作執行 script/autotune_train.py，結果寫入專案的 setting.json，之後的訓練自動套用
+    if not project_name or not task_name or not reference_model:
+        yield "請先選擇專案、參考模型並填寫任務名稱！\n"
+        return
+    try:
+        job_id = submit_job(project_name, 'tune', [
+            'python', 'script/autotune_train.py',
+            '--project_name', project_name,
+            '--task_name', task_name,
+            '--reference_model', reference_model,
+            '--batch_size', str(int(batch_size)),
+            '--burst_steps', str(int(burst_steps))
+        ])
+
+        for text, status in follow_output(project_name, job_id):
+            yield text
+        if status == 'finished':
+            yield text + "調校完成，之後的訓練會套用最佳設定！\n"
+        else:
+            yield text + "調校失敗！\n"
+    except Exception as e:
+        yield "調校失敗！\n" + str(e)